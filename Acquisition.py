@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Direct acquisition of the CDP over a serial port with asyncio, i.e. what
+CDP_Communications.cr3 does on the CR3000 without the DMT software.
+
+The CDP is set up with the cdp_comm_cmd_setup block (and its checksum)
+until it acknowledges, afterwards it is polled with the data command
+0x1B021D00 at a fixed rate. As on the logger every scan looks at how many
+bytes are waiting (SerialInChk) and
+    - less than one response      -> skipped scan
+    - more than two responses and
+      not a multiple of 156 bytes -> flushed scan
+    - otherwise                   -> one response is taken and the next
+                                     data command is sent
+Skipped and flushed scans count as wrong scans, after more than five
+wrong scans in a row the port is flushed and the data command sent again
+to get back in sync.
+
+The serial port is read without blocking by the event loop, every taken
+response is put on a bounded asyncio.Queue. If the consumer is too slow
+the scans wait for free space (back-pressure) instead of piling up
+records, the responses meanwhile wait in the port buffer and show up as
+flushed scans like on the logger.
+
+    async def main():
+        acquisition = CDPAcquisition(SerialPort('/dev/ttyUSB0'))
+        task = asyncio.create_task(acquisition.run())
+        while True:
+            record = await acquisition.queue.get()
+            decoded = DecodeRaw(record['packet'])
+
+Everything that offers write (a coroutine)/inwaiting/read/flush/close
+like SerialPort can be used as port, e.g. the slave side of a pty with a
+stand-in instrument on the master side.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import asyncio
+import os
+import time
+
+from DecodeRaw import PACKET_LENGTH
+
+# cdp_comm_cmd_setup of the logger program: command number, ADC threshold,
+# number of bins, DOF, (unused) and the thresholds of the 40 bins
+CDP_SETUP = [0x1B011400, 0x00001E00,
+             0x01000000, 0x40000000,
+             0x00000000, 0x5b006f00,
+             0x9f00be00, 0xd700f300,
+             0xfe001001, 0x2d016301,
+             0x7e01e801, 0x7c02ef02,
+             0x4e03bf03, 0x2e041105,
+             0xac058106, 0x3b07e007,
+             0xb608d109, 0xd30abb0b,
+             0x940c600d, 0x4c0eff0f,
+             0x00000000, 0x00000000,
+             0x00000000, 0x00000000,
+             0x00000000]
+
+# cdp_comm_cmd_data, asks the cdp for one response of PACKET_LENGTH bytes
+CMD_DATA = bytes.fromhex('1B021D00')
+
+# first two bytes of the answer to the setup command
+CDP_ACK = bytes.fromhex('0606')
+CDP_NAK = bytes.fromhex('1515')
+
+# wrong scans in a row after which the port is flushed (cdp_wrong_scans)
+MAX_WRONG_SCANS = 5
+
+# records kept in the queue before the scans have to wait
+QUEUESIZE = 2**10
+
+
+def SetupCommand(setup=CDP_SETUP):
+    # the bytes sent for the setup: the longs MSB first as on the logger and
+    # the byte sum of them as 2 byte checksum, LSB first
+    block = b''.join(_.to_bytes(4, 'big') for _ in setup)
+    chksum = sum(block) & 0xFFFF
+    return block + chksum.to_bytes(2, 'little')
+
+
+class SerialPort:
+    # non blocking serial port (or pty) on posix, the event loop reads
+    # everything that arrives into a buffer, like the buffer of SerialOpen
+    def __init__(self, device, baudrate=57600, buffersize=8192):
+        import termios
+        import tty
+        self.device = device
+        self.buffersize = buffersize
+        self.buffer = bytearray()
+        self.fd = os.open(device, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        if os.isatty(self.fd):
+            tty.setraw(self.fd)
+            speed = getattr(termios, 'B' + str(baudrate))
+            attributes = termios.tcgetattr(self.fd)
+            attributes[4] = attributes[5] = speed
+            termios.tcsetattr(self.fd, termios.TCSANOW, attributes)
+        self.loop = None
+
+    def start(self, loop=None):
+        # start reading in the background, done by CDPAcquisition.run
+        self.loop = loop or asyncio.get_running_loop()
+        self.loop.add_reader(self.fd, self._read)
+
+    def _read(self):
+        try:
+            data = os.read(self.fd, self.buffersize)
+        except (BlockingIOError, InterruptedError):
+            return
+        self.buffer += data
+        # like the logger the oldest bytes are lost if the buffer is full
+        if len(self.buffer) > self.buffersize:
+            del self.buffer[:len(self.buffer) - self.buffersize]
+
+    async def write(self, data):
+        # while the output buffer of the port is full, wait for it to be
+        # writable again without blocking the event loop (and the reader)
+        data = memoryview(data)
+        while data:
+            try:
+                data = data[os.write(self.fd, data):]
+            except BlockingIOError:
+                await self._writable()
+
+    def _writable(self):
+        # future that is done once the port can be written to
+        loop = self.loop or asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def _ready():
+            loop.remove_writer(self.fd)
+            if not future.done():
+                future.set_result(None)
+
+        loop.add_writer(self.fd, _ready)
+        return future
+
+    def inwaiting(self):
+        # number of bytes in the buffer (SerialInChk)
+        return len(self.buffer)
+
+    def read(self, n):
+        # take n bytes from the buffer (SerialInBlock)
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        return data
+
+    def flush(self):
+        # drop everything received so far (SerialFlush)
+        self._read()
+        self.buffer.clear()
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.fd)
+            self.loop.remove_writer(self.fd)
+            self.loop = None
+        os.close(self.fd)
+
+
+class CDPAcquisition:
+    # polls the cdp at frequency (Hz) and puts every response as a dict
+    # with time, packet and the scan counters on queue
+    def __init__(self,
+                 port,
+                 frequency=10,  # as Hz
+                 queue=None,
+                 queuesize=QUEUESIZE,
+                 setup=CDP_SETUP,
+                 setupdelay=1,  # in s, should be at least 0.25
+                 ):
+        self.port = port
+        self.frequency = frequency
+        self.queue = queue if queue is not None else asyncio.Queue(queuesize)
+        self.setupcommand = SetupCommand(setup)
+        self.setupdelay = setupdelay
+        self.firmware = None
+        self.debug_answer = None
+        self.skipped_scans = 0
+        self.flushed_scans = 0
+        self.wrong_scans = 0
+        self.records = 0
+        self.running = False
+
+    async def setup(self):
+        # send the setup command until the cdp acknowledges it
+        while self.firmware is None:
+            await self.port.write(self.setupcommand)
+            await asyncio.sleep(1 / self.frequency)
+            resplen = self.port.inwaiting()
+            if resplen < 1:
+                continue
+            response = self.port.read(4)
+            self.port.flush()
+            if response[:2] == CDP_ACK:
+                # the firmware is only sent with a successful setup
+                self.firmware = int.from_bytes(response[2:4], 'big')
+            elif response[:2] != CDP_NAK:
+                # should not happen, kept for debugging as on the logger
+                self.debug_answer = response
+
+        # the delay is important for the communication to work properly
+        await asyncio.sleep(self.setupdelay)
+        self.port.flush()
+        await self.port.write(CMD_DATA)
+        return self.firmware
+
+    async def scan(self):
+        # one scan of the logger program, returns the record or None
+        record = None
+        resplen = self.port.inwaiting()
+        if resplen < PACKET_LENGTH:
+            self.skipped_scans += 1
+            self.wrong_scans += 1
+        elif (resplen > 2 * PACKET_LENGTH and
+              resplen % PACKET_LENGTH > 0):
+            self.flushed_scans += 1
+            self.wrong_scans += 1
+        else:
+            self.wrong_scans = 0
+            packet = self.port.read(PACKET_LENGTH)
+            await self.port.write(CMD_DATA)
+            record = {'time': time.time(),
+                      'packet': packet,
+                      'cdp_flushed_scans': self.flushed_scans,
+                      'cdp_skipped_scans': self.skipped_scans,
+                      'cdp_wrong_scans': self.wrong_scans,
+                      }
+            # waits if the queue is full
+            await self.queue.put(record)
+            self.records += 1
+
+        if self.wrong_scans > MAX_WRONG_SCANS:
+            self.port.flush()
+            await self.port.write(CMD_DATA)
+            self.wrong_scans = 0
+
+        return record
+
+    async def run(self, nrecords=None, duration=None):
+        # set up the cdp and scan until stop() is called, nrecords are
+        # taken or duration (in s) has passed
+        loop = asyncio.get_running_loop()
+        if hasattr(self.port, 'start'):
+            self.port.start(loop)
+
+        self.running = True
+        await self.setup()
+
+        period = 1 / self.frequency
+        start = loop.time()
+        nextscan = start + period
+        while self.running:
+            await asyncio.sleep(max(0, nextscan - loop.time()))
+            await self.scan()
+
+            if nrecords is not None and self.records >= nrecords:
+                break
+            if duration is not None and loop.time() - start >= duration:
+                break
+
+            nextscan += period
+            # if a full queue held the scans back, do not try to catch up
+            # with a burst of scans
+            if nextscan < loop.time() - period:
+                nextscan = loop.time()
+        self.running = False
+
+    def stop(self):
+        self.running = False
+
+
+def Acquire(device,
+            nrecords=None,
+            duration=None,  # in s
+            frequency=10,  # as Hz
+            baudrate=57600,
+            ):
+    # blocking helper that acquires nrecords (or for duration) from the
+    # cdp at device and returns the records
+    async def _main():
+        port = SerialPort(device, baudrate=baudrate)
+        acquisition = CDPAcquisition(port, frequency=frequency, queuesize=0)
+        try:
+            await acquisition.run(nrecords=nrecords, duration=duration)
+        finally:
+            port.close()
+        records = []
+        while not acquisition.queue.empty():
+            records.append(acquisition.queue.get_nowait())
+        return records
+
+    return asyncio.run(_main())
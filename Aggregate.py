@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Aggregation of the 10 Hz records to intervals (1 s, 1 min, 30 min, ...)
+with grouped reductions (np.ufunc.reduceat) over the sorted timestamps.
+
+The default fields are the ones of the cdp_data_halfhour table of the
+logger program, so aggregating the cdp_data table to 1800 s gives the same
+as the cdp_data_30min files: housekeeping averages, quality averages,
+maxima and minima, totals of the DOF rejects, ADC overflows and bins and
+the minima/maxima of the scan counters. As on the logger an interval is
+labeled with its end and includes the records up to and including it.
+
+The data can be given in chunks (see ReadTOB1Chunks): StreamAggregator
+keeps the interval that is not complete yet and merges it with the next
+chunk, so the result does not depend on the chunking.
+
+    aggregator = StreamAggregator(interval=1800)
+    for chunk in ReadTOB1Chunks('CDP_EC_cdp_data_0.dat'):
+        for result in aggregator.add(chunk):
+            ...
+    last = aggregator.finish()
+
+With the sampled volume (windspeed) the concentration, LWC, MVD and ED of
+the aggregated spectra are given as well (AggregateSpectra).
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+from DecodeRaw import HOUSEKEEPING_NAMES, QUALITY_NAMES
+
+# interval of the cdp_data_halfhour table in s
+HALFHOUR = 1800
+
+# output name, input name and reduction of the cdp_data_halfhour table
+# in the order of the table
+HALFHOUR_FIELDS = (
+    [(_ + '_Avg', _, 'avg') for _ in HOUSEKEEPING_NAMES] +
+    [(_ + '_Avg', _, 'avg') for _ in QUALITY_NAMES] +
+    [(_ + '_Max', _, 'max') for _ in QUALITY_NAMES] +
+    [(_ + '_Min', _, 'min') for _ in QUALITY_NAMES] +
+    [('ADC_Overflow_Tot', 'ADC_Overflow', 'tot'),
+     ('ADC_Overflow_Max', 'ADC_Overflow', 'max'),
+     ('ADC_Overflow_Min', 'ADC_Overflow', 'min'),
+     ('DOF_Reject_Tot', 'DOF_Reject', 'tot'),
+     ('cdp_data_bincount_Tot', 'cdp_data_bincount', 'tot'),
+     ('cdp_flushed_scans_Min', 'cdp_flushed_scans', 'min'),
+     ('cdp_flushed_scans_Max', 'cdp_flushed_scans', 'max'),
+     ('cdp_skipped_scans_Min', 'cdp_skipped_scans', 'min'),
+     ('cdp_skipped_scans_Max', 'cdp_skipped_scans', 'max'),
+     ('cdp_wrong_scans_Min', 'cdp_wrong_scans', 'min'),
+     ('cdp_wrong_scans_Max', 'cdp_wrong_scans', 'max'),
+     ])
+
+_REDUCE = {'avg': np.add, 'tot': np.add, 'max': np.maximum,
+           'min': np.minimum}
+
+
+def IntervalLabels(time, interval=HALFHOUR, closed='right'):
+    # the interval of each record, labeled by its end for closed='right'
+    # (as the logger does) or by its start for closed='left'
+    time = np.asarray(time, dtype=np.float64)
+    if closed == 'right':
+        return np.ceil(time / interval) * interval
+    elif closed == 'left':
+        return np.floor(time / interval) * interval
+    raise ValueError('closed must be right or left')
+
+
+def GroupStarts(labels):
+    # index of the first record of each group of equal (sorted) labels
+    if labels.shape[0] == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.flatnonzero(np.concatenate([[True],
+                                          labels[1:] != labels[:-1]]))
+
+
+def GroupReduce(values, starts, how='tot'):
+    # reduce the records of each group, avg gives the sum (divided later)
+    values = np.asarray(values)
+    if how == 'avg':
+        values = values.astype(np.float64)
+    return _REDUCE[how].reduceat(values, starts, axis=0)
+
+
+def _merge(first, second, fields):
+    # combine two reductions of the same interval
+    merged = {'time': first['time'], 'nrecords':
+              first['nrecords'] + second['nrecords']}
+    for name, _, how in fields:
+        merged[name] = _REDUCE[how](first[name], second[name])
+    if 'volume' in first:
+        merged['volume'] = first['volume'] + second['volume']
+    return merged
+
+
+def _finish(reduced, fields):
+    # averages from the sums, as IEEE4 like the logger writes them
+    result = dict(reduced)
+    for name, _, how in fields:
+        if how == 'avg':
+            result[name] = (reduced[name] / reduced['nrecords']).astype(
+                np.float32)
+    return result
+
+
+def _take(reduced, rows):
+    return {name: values[rows] for name, values in reduced.items()}
+
+
+class StreamAggregator:
+    # aggregates chunks of records (structured arrays of the cdp_data table
+    # or dicts with time and the fields) to intervals of interval seconds
+    # fields are (output name, input name, avg/tot/max/min), fields that
+    # are not in the data are left out
+    # windspeed (number, field name or function of the chunk as in
+    # Pipeline) gives the total sampled volume per interval in cm^3
+    def __init__(self,
+                 interval=HALFHOUR,  # in s
+                 fields=HALFHOUR_FIELDS,
+                 closed='right',
+                 windspeed=None,  # in m/s
+                 samplearea=0.298,  # as area in square millimeters
+                 samplefrequency=10,  # as Hz
+                 ):
+        self.interval = interval
+        self.fields = list(fields)
+        self.closed = closed
+        self.windspeed = windspeed
+        self.samplearea = samplearea
+        self.samplefrequency = samplefrequency
+        self.pending = None
+        self._present = None
+
+    def _names(self, chunk):
+        if isinstance(chunk, dict):
+            return set(chunk.keys())
+        return set(chunk.dtype.names)
+
+    def reduce(self, chunk):
+        # reduction of one chunk per interval, not yet merged with pending
+        if self._present is None:
+            names = self._names(chunk)
+            self._present = [_ for _ in self.fields if _[1] in names]
+
+        if isinstance(chunk, dict):
+            time = np.asarray(chunk['time'], dtype=np.float64)
+        else:
+            from Pipeline import ChunkTime
+            time = ChunkTime(chunk)
+
+        labels = IntervalLabels(time, self.interval, closed=self.closed)
+        if labels.shape[0] > 1 and np.any(labels[1:] < labels[:-1]):
+            raise ValueError('The records need to be sorted by time')
+        starts = GroupStarts(labels)
+
+        reduced = {'time': labels[starts],
+                   'nrecords': np.diff(np.append(starts, labels.shape[0]))}
+        for name, field, how in self._present:
+            reduced[name] = GroupReduce(chunk[field], starts, how)
+
+        if self.windspeed is not None:
+            from ConcPerCCM import SampleVolume
+            from Pipeline import _perrecord
+            windspeed = _perrecord(self.windspeed, chunk,
+                                   np.ones(labels.shape[0], dtype=bool))
+            volume = SampleVolume(windspeed=windspeed,
+                                  samplearea=self.samplearea,
+                                  samplefrequency=self.samplefrequency)
+            # like ConcPerCCM, records with no volume count as nothing
+            volume = np.broadcast_to(np.nan_to_num(volume), labels.shape)
+            reduced['volume'] = np.add.reduceat(volume, starts)
+        return reduced
+
+    def add(self, chunk):
+        # add a chunk, returns the intervals that are complete (as list
+        # with one dict of arrays, empty if none was completed)
+        if len(chunk['time'] if isinstance(chunk, dict) else chunk) == 0:
+            return []
+        reduced = self.reduce(chunk)
+
+        if self.pending is not None:
+            if reduced['time'][0] == self.pending['time'][0]:
+                first = _merge(self.pending, _take(reduced, slice(0, 1)),
+                               self._present)
+                reduced = {name: np.concatenate([first[name],
+                                                 reduced[name][1:]])
+                           for name in reduced}
+            elif reduced['time'][0] < self.pending['time'][0]:
+                raise ValueError('The chunks need to be sorted by time')
+            else:
+                reduced = {name: np.concatenate([self.pending[name],
+                                                 reduced[name]])
+                           for name in reduced}
+
+        # the last interval may continue in the next chunk
+        self.pending = _take(reduced, slice(-1, None))
+        if reduced['time'].shape[0] == 1:
+            return []
+        return [_finish(_take(reduced, slice(None, -1)), self._present)]
+
+    def finish(self):
+        # the last (possibly incomplete) interval
+        if self.pending is None:
+            return None
+        result = _finish(self.pending, self._present)
+        self.pending = None
+        return result
+
+
+def AggregateSpectra(result,
+                     binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14,
+                               16, 18, 20, 22, 24, 26, 28, 30, 32, 34, 36,
+                               38, 40, 42, 44, 46, 48, 50],
+                     binfield='cdp_data_bincount_Tot',
+                     ):
+    # concentration (# / cm^3), lwc (g / m^3), mvd and ed (micrometer) of
+    # the aggregated spectra, i.e. total counts over total sampled volume
+    from ED import ED
+    from LWC import LWC
+    from MVD import MVD
+
+    if 'volume' not in result:
+        raise ValueError('The spectra need the sampled volume, aggregate ' +
+                         'with a windspeed')
+    if binfield not in result:
+        raise ValueError('No aggregated bins ' + binfield + ' in the result')
+
+    counts = np.asarray(result[binfield], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conc = counts / result['volume'][:, np.newaxis]
+    conc = np.nan_to_num(conc, copy=False, posinf=0)
+
+    lwc = LWC(conc * 10**6, binsizes=binsizes, combined=False)
+    result['conc_total'] = conc.sum(axis=1)
+    result['lwc_total'] = lwc.sum(axis=1)
+    result['mvd'] = MVD(lwc, binsizes=binsizes)
+    result['ed'] = ED(counts, binsizes=binsizes)
+    return result
+
+
+def Aggregate(chunks, finish=True, spectra=False, binsizes=None, **kwargs):
+    # aggregate an iterable of chunks (or a single array) into one dict,
+    # kwargs are passed to StreamAggregator
+    if isinstance(chunks, (np.ndarray, dict)):
+        chunks = [chunks]
+    aggregator = StreamAggregator(**kwargs)
+    results = []
+    for chunk in chunks:
+        results += aggregator.add(chunk)
+    if finish:
+        last = aggregator.finish()
+        if last is not None:
+            results.append(last)
+    if not results:
+        return {}
+
+    result = {name: np.concatenate([_[name] for _ in results])
+              for name in results[0]}
+    if spectra:
+        result = (AggregateSpectra(result) if binsizes is None else
+                  AggregateSpectra(result, binsizes=binsizes))
+    return result
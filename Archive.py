@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compact archive of years of CDP records, split into chunks of records with
+one memory mappable .npy file per column and chunk.
+
+An archive is a directory:
+    index.npz                 per chunk: first record, number of records,
+                              first/last time and min/max of every column
+    chunk_000000/time.npy     seconds since the logger epoch (float64)
+    chunk_000000/bins.npy     records x 30 counts (uint16, uint32 if a
+                              count of the chunk does not fit)
+    chunk_000000/total_counts.npy
+                              counts over all bins per record (uint32)
+    chunk_000000/<field>.npy  the other fields of the cdp_data table,
+                              float32 for the housekeeping and quality
+The records have to be added in time order, so the time of each chunk is
+sorted. A query first picks the chunks by the index (time range and the
+min/max of the columns) and only maps these, the time range within a chunk
+is found with searchsorted:
+
+    WriteArchive('/data/cdp/archive', CampaignFiles('/data/cdp'))
+    archive = Archive('/data/cdp/archive')
+    for year in [2017, 2018, 2019]:
+        fog = archive.read(str(year) + '-06-01', str(year) + '-07-01',
+                           columns=['time', 'bins'], droplets=True)
+        conc = ConcPerCCM(fog['bins'], windspeed=5, combined=False)
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import os
+
+import numpy as np
+
+from Pipeline import CHUNKSIZE, LOGGER_EPOCH, ChunkTime
+
+# records per chunk of the archive, at 10 Hz a bit less than an hour
+ARCHIVE_CHUNKSIZE = 2**15
+
+# fields of the tables that are in time already
+_TIMEFIELDS = ['time', 'SECONDS', 'NANOSECONDS']
+
+
+def ArchiveTime(value):
+    # seconds since the logger epoch of a number, np.datetime64 or an
+    # iso date string ('2019-06-01', '2019-06-01T12:00')
+    if value is None:
+        return None
+    if isinstance(value, (str, np.datetime64)):
+        return float((np.datetime64(value) - LOGGER_EPOCH) /
+                     np.timedelta64(1, 's'))
+    return float(value)
+
+
+def ArchiveColumns(data, binfield='cdp_data_bincount'):
+    # the columns of the archive for records of the cdp_data table (or of
+    # the cdp_data_raw table, which are decoded) or a dict with time and
+    # the fields (as from DecodeRaw)
+    if isinstance(data, dict):
+        time = data['time']
+    else:
+        time = ChunkTime(data)
+        if 'dummy' in data.dtype.names:
+            from DecodeRaw import DecodeRaw
+            data = DecodeRaw(data)
+
+    if isinstance(data, dict):
+        bins = data[binfield]
+        names = [_ for _ in data.keys() if _ != binfield]
+    else:
+        from ReadTOB1 import TOB1Bins
+        bins = TOB1Bins(data, binfield=binfield)
+        # ungrouped bins are single fields binfield(1) ... binfield(30)
+        names = [_ for _ in data.dtype.names
+                 if _ != binfield and not _.startswith(binfield + '(')]
+
+    columns = {'time': np.asarray(time, dtype=np.float64),
+               'bins': np.asarray(bins, dtype=np.uint32)}
+    columns['total_counts'] = columns['bins'].sum(axis=1, dtype=np.uint32)
+    for name in names:
+        if name in _TIMEFIELDS:
+            continue
+        values = np.asarray(data[name])
+        if values.dtype.kind == 'f':
+            columns[name] = values.astype(np.float32)
+        elif values.dtype.kind in 'iub':
+            # the logger writes its integers MSB first
+            columns[name] = values.astype(values.dtype.newbyteorder('='))
+    return columns
+
+
+def _summary(values):
+    # min and max of a column of a chunk, nan is ignored
+    if values.ndim != 1 or values.shape[0] == 0:
+        return np.nan, np.nan
+    return (float(np.fmin.reduce(values, axis=0)),
+            float(np.fmax.reduce(values, axis=0)))
+
+
+class ArchiveWriter:
+    # adds records to an (existing) archive, full chunks are written as
+    # soon as they are complete, close() writes the last partial chunk
+    def __init__(self, path, chunksize=ARCHIVE_CHUNKSIZE):
+        self.path = path
+        self.chunksize = chunksize
+        self.pending = []
+        self.npending = 0
+        os.makedirs(path, exist_ok=True)
+        archive = Archive(path)
+        self.index = {name: list(values)
+                      for name, values in archive.index.items()}
+        self.columns = archive.columns
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, data):
+        # add records (see ArchiveColumns), they need to be sorted by time
+        # and after the records added before
+        columns = ArchiveColumns(data)
+        time = columns['time']
+        if time.shape[0] == 0:
+            return
+        if np.any(time[1:] < time[:-1]):
+            raise ValueError('The records need to be sorted by time')
+        last = (self.pending[-1]['time'][-1] if self.pending else
+                self.index['tmax'][-1] if self.index['tmax'] else -np.inf)
+        if time[0] < last:
+            raise ValueError('The records need to be added in time order')
+        if self.columns is None:
+            self.columns = list(columns.keys())
+        elif sorted(self.columns) != sorted(columns.keys()):
+            raise ValueError('The records need the same fields as the ' +
+                             'archive: ' + ', '.join(self.columns))
+
+        self.pending.append(columns)
+        self.npending += time.shape[0]
+        while self.npending >= self.chunksize:
+            self._write(self.chunksize)
+
+    def _write(self, nrecords):
+        # write the first nrecords of pending as a chunk
+        merged = {name: np.concatenate([_[name] for _ in self.pending])
+                  for name in self.columns}
+        chunk = {name: values[:nrecords] for name, values in merged.items()}
+        rest = {name: values[nrecords:] for name, values in merged.items()}
+        self.pending = [rest] if rest['time'].shape[0] else []
+        self.npending = rest['time'].shape[0]
+
+        if chunk['bins'].max(initial=0) <= np.iinfo(np.uint16).max:
+            chunk['bins'] = chunk['bins'].astype(np.uint16)
+
+        number = len(self.index['nrecords'])
+        directory = os.path.join(self.path, 'chunk_%06d' % number)
+        os.makedirs(directory, exist_ok=True)
+        for name, values in chunk.items():
+            np.save(os.path.join(directory, name + '.npy'), values)
+
+        self.index['start'].append(sum(self.index['nrecords']))
+        self.index['nrecords'].append(nrecords)
+        self.index['tmin'].append(float(chunk['time'][0]))
+        self.index['tmax'].append(float(chunk['time'][-1]))
+        for name in self.columns:
+            low, high = _summary(chunk[name])
+            self.index.setdefault('min_' + name, []).append(low)
+            self.index.setdefault('max_' + name, []).append(high)
+        self._writeindex()
+
+    def _writeindex(self):
+        # the index is replaced at once, a chunk only counts once it is in
+        filename = os.path.join(self.path, 'index.npz')
+        tmpfile = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(tmpfile, 'wb') as fo:
+            np.savez(fo, columns=np.asarray(self.columns),
+                     **{name: np.asarray(values)
+                        for name, values in self.index.items()})
+        os.replace(tmpfile, filename)
+
+    def close(self):
+        if self.npending:
+            self._write(self.npending)
+
+
+class Archive:
+    # reads chunks of an archive selected by time and min/max of columns
+    def __init__(self, path):
+        self.path = path
+        self.reload()
+
+    def reload(self):
+        self.index = {'start': [], 'nrecords': [], 'tmin': [], 'tmax': []}
+        self.columns = None
+        filename = os.path.join(self.path, 'index.npz')
+        if os.path.exists(filename):
+            with np.load(filename) as stored:
+                self.columns = [str(_) for _ in stored['columns']]
+                self.index = {name: stored[name] for name in stored.files
+                              if name != 'columns'}
+        self.index = {name: np.asarray(values)
+                      for name, values in self.index.items()}
+
+    def __len__(self):
+        return int(np.sum(self.index['nrecords']))
+
+    def __repr__(self):
+        return ('Archive(' + repr(self.path) + ', ' + str(len(self)) +
+                ' records in ' + str(self.nchunks) + ' chunks)')
+
+    @property
+    def nchunks(self):
+        return self.index['nrecords'].shape[0]
+
+    def column(self, number, name):
+        # memory map of a column of a chunk
+        return np.load(os.path.join(self.path, 'chunk_%06d' % number,
+                                    name + '.npy'), mmap_mode='r')
+
+    def _where(self, where=None, droplets=False):
+        # the conditions as {column: (min, max)}, None is open
+        where = dict(where or {})
+        if droplets:
+            low, high = where.get('total_counts', (None, None))
+            where['total_counts'] = (max(1, low or 0), high)
+        return where
+
+    def chunks(self, start=None, stop=None, where=None, droplets=False):
+        # numbers of the chunks that can have records between start
+        # (included) and stop (excluded) and within the limits of where
+        # ({column: (min, max)}), droplets=True only for records with counts
+        selected = np.ones(self.nchunks, dtype=bool)
+        start, stop = ArchiveTime(start), ArchiveTime(stop)
+        if start is not None:
+            selected &= self.index['tmax'] >= start
+        if stop is not None:
+            selected &= self.index['tmin'] < stop
+        for name, (low, high) in self._where(where, droplets).items():
+            if 'min_' + name not in self.index:
+                raise KeyError('No column ' + name + ' in the archive')
+            # nan (no summary) never excludes a chunk
+            with np.errstate(invalid='ignore'):
+                if low is not None:
+                    selected &= ~(self.index['max_' + name] < low)
+                if high is not None:
+                    selected &= ~(self.index['min_' + name] > high)
+        return np.flatnonzero(selected)
+
+    def iterchunks(self, start=None, stop=None, columns=None, where=None,
+                   droplets=False):
+        # yields a dict of the columns for the matching records of each
+        # selected chunk, whole chunks are given as memory maps
+        columns = self.columns if columns is None else list(columns)
+        where = self._where(where, droplets)
+        tstart, tstop = ArchiveTime(start), ArchiveTime(stop)
+        for number in self.chunks(start, stop, where):
+            time = self.column(number, 'time')
+            first = (0 if tstart is None else
+                     np.searchsorted(time, tstart, side='left'))
+            last = (time.shape[0] if tstop is None else
+                    np.searchsorted(time, tstop, side='left'))
+            if last <= first:
+                continue
+            rows = slice(first, last)
+
+            mask = None
+            for name, (low, high) in where.items():
+                values = self.column(number, name)[rows]
+                _mask = np.ones(last - first, dtype=bool)
+                if low is not None:
+                    _mask &= values >= low
+                if high is not None:
+                    _mask &= values <= high
+                mask = _mask if mask is None else mask & _mask
+            if mask is not None and not mask.any():
+                continue
+
+            chunk = {}
+            for name in columns:
+                values = self.column(number, name)[rows]
+                chunk[name] = (values if mask is None or mask.all() else
+                               values[mask])
+            yield chunk
+
+    def read(self, start=None, stop=None, columns=None, where=None,
+             droplets=False):
+        # the matching records of all selected chunks as one dict of arrays
+        # (see iterchunks), e.g. read(...)['bins'] for ConcPerCCM
+        columns = self.columns if columns is None else list(columns)
+        chunks = list(self.iterchunks(start, stop, columns=columns,
+                                      where=where, droplets=droplets))
+        if not chunks:
+            if not self.nchunks:
+                return {name: np.zeros(0) for name in columns or []}
+            # empty arrays with the shape and type of the columns
+            return {name: self.column(0, name)[:0] for name in columns}
+        return {name: np.concatenate([_[name] for _ in chunks])
+                for name in columns}
+
+
+def WriteArchive(path,
+                 filenames,
+                 chunksize=ARCHIVE_CHUNKSIZE,
+                 readchunksize=CHUNKSIZE,
+                 ):
+    # add the records of TOB1 files (cdp_data or cdp_data_raw table, in
+    # time order) to the archive at path, returns the Archive
+    from ReadTOB1 import ReadTOB1Chunks
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    with ArchiveWriter(path, chunksize=chunksize) as writer:
+        for filename in filenames:
+            for chunk in ReadTOB1Chunks(filename, chunksize=readchunksize):
+                writer.add(chunk)
+    return Archive(path)
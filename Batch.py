@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch reprocessing of a whole campaign directory with a process pool.
+
+The logger writes one cdp_data file per day (TableFile(...,1,Day,...)), so
+each day file is an independent job: it is read in chunks, decoded and run
+through ConcPerCCM/LWC/MVD/ED/FluxGrav (see Pipeline.StreamCampaign) in a
+worker process. The results are merged in the order of the files and then
+(stable) by time, so the output is the same for any number of workers.
+
+With an outdir the result of every day file is stored there as soon as it
+is done. A rerun (e.g. after a failure or an interruption) only processes
+the files that have no stored result for the same settings yet.
+
+    result, failed = BatchProcess(CampaignFiles('/data/cdp'),
+                                  outdir='/data/cdp/processed',
+                                  rebin='Gonser2011', njobs=8)
+
+Settings like a callable windspeed have to be picklable, i.e. defined on
+module level, to be sent to the workers. A windspeed or T given as an
+object with a settings() method (e.g. WindJoin) is compared by what that
+gives (for a WindJoin the wind series, method, tolerance and fill), so a
+WindJoin of other wind data does not reuse a stored result, and the files
+are never read again just to compare the settings.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import os
+
+import numpy as np
+
+from Pipeline import RESULT_NAMES, SettingsToken, StreamCampaign
+
+
+def _settings(kwargs):
+    # text representation of the settings a result was processed with
+    return repr(SettingsToken(kwargs))
+
+
+def ResultFile(outdir, filename):
+    # where the result of a day file is stored in outdir
+    return os.path.join(outdir, os.path.basename(filename) + '.npz')
+
+
+def ConcatResults(results):
+    # join a list of result dicts (of StreamCampaign/ProcessFile) into one
+    if not results:
+        return {name: np.empty(0) for name in RESULT_NAMES}
+    return {name: np.concatenate([_[name] for _ in results])
+            for name in RESULT_NAMES}
+
+
+def LoadResult(outdir, filename, settings=None, **kwargs):
+    # the stored result of a day file, None if there is none or it was
+    # processed with other settings
+    # settings (from _settings) saves hashing the kwargs again per file
+    resultfile = ResultFile(outdir, filename)
+    if not os.path.exists(resultfile):
+        return None
+    if settings is None:
+        settings = _settings(kwargs)
+    try:
+        with np.load(resultfile) as stored:
+            if str(stored['settings']) != settings:
+                return None
+            return {name: stored[name] for name in RESULT_NAMES}
+    except (OSError, ValueError, KeyError):
+        # incomplete or broken file, process the day again
+        return None
+
+
+def ProcessFile(filename, outdir=None, cache=None, **kwargs):
+    # process one day file, kwargs are passed to StreamCampaign
+    # with an outdir the result is stored there as well, together with
+    # the settings it was processed with
+    # cache (a ResultsCache or its directory) reuses the decoded counts
+    # and results of earlier runs, see Cache
+    if cache is not None:
+        from Cache import CachedProcessFile
+        result = CachedProcessFile(filename, cache=cache, **kwargs)
+    else:
+        result = ConcatResults(list(StreamCampaign([filename], **kwargs)))
+    if outdir is None:
+        return result
+
+    resultfile = ResultFile(outdir, filename)
+    # write to a temporary file first so an interrupted run never leaves
+    # a partial result that would be taken as done
+    tmpfile = resultfile + '.' + str(os.getpid()) + '.tmp'
+    with open(tmpfile, 'wb') as fo:
+        np.savez(fo, settings=_settings(kwargs), **result)
+    os.replace(tmpfile, resultfile)
+    return result
+
+
+def BatchProcess(filenames,
+                 outdir=None,
+                 njobs=None,
+                 resume=True,
+                 quiet=False,
+                 cache=None,
+                 **kwargs,
+                 ):
+    # process all day files in parallel, kwargs are passed to
+    # StreamCampaign (windspeed, samplearea, rebin, T, ...)
+    # njobs is the number of worker processes, None uses all cores and
+    # 1 processes the files one after the other in this process
+    # cache (see Cache) only recalculates the stages whose inputs changed
+    # returns the merged result and the list of files that failed
+    if isinstance(filenames, str):
+        filenames = [filenames]
+
+    results = [None] * len(filenames)
+    if outdir is not None:
+        os.makedirs(outdir, exist_ok=True)
+        if resume:
+            settings = _settings(kwargs)
+            for ix, filename in enumerate(filenames):
+                results[ix] = LoadResult(outdir, filename,
+                                         settings=settings)
+
+    todo = [ix for ix, result in enumerate(results) if result is None]
+    failed = []
+
+    def _done(ix, result):
+        # the result as the worker gave it, it is stored in outdir already
+        results[ix] = result
+
+    def _failed(ix, error):
+        failed.append(filenames[ix])
+        if not quiet:
+            print('Processing of', filenames[ix], 'failed:', repr(error))
+
+    if njobs == 1 or len(todo) <= 1:
+        for ix in todo:
+            try:
+                _done(ix, ProcessFile(filenames[ix], outdir=outdir,
+                                      cache=cache, **kwargs))
+            except Exception as error:
+                _failed(ix, error)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=njobs) as pool:
+            jobs = {ix: pool.submit(ProcessFile, filenames[ix],
+                                    outdir=outdir, cache=cache, **kwargs)
+                    for ix in todo}
+            # collected in file order, so the messages are deterministic too
+            for ix in todo:
+                try:
+                    _done(ix, jobs[ix].result())
+                except Exception as error:
+                    _failed(ix, error)
+
+    result = ConcatResults([_ for _ in results if _ is not None])
+
+    # the files are in time order already, a stable sort only changes
+    # anything if files overlap (e.g. after the logger clock was set)
+    time = result['time']
+    if np.any(time[1:] < time[:-1]):
+        order = np.argsort(time, kind='stable')
+        result = {name: values[order] for name, values in result.items()}
+
+    return result, failed
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bins along any axis of N-D arrays, e.g. stations x time x bins for several
+CDPs/FMs run side by side.
+
+ConcPerCCM, LWC, MVD, ED, FluxGrav, Rebin, Gonser2011 and Spiegel2012 take
+binaxis (default -1, the bins last as in records x bins). Other layouts
+are brought to records x bins without a copy where possible (all but the
+bin axis are flattened into records), calculated in one call and brought
+back: per bin results keep the bin axis where it was, per record results
+have the shape of the array without the bin axis.
+
+The per record arguments (windspeed, samplearea, samplefrequency, T) are
+broadcast against the array without the bin axis with the usual numpy
+rules, so one sample area per station is given as stations x 1:
+
+    bins.shape                  # (3, 36000, 30) stations x time x bins
+    conc = ConcPerCCM(bins, windspeed=wind,      # (3, 36000)
+                      samplearea=[[0.298], [0.27], [0.3]], combined=False)
+    mvd = MVD(LWC(conc * 10**6, combined=False))  # (3, 36000)
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+# arguments that can be given per record (or per station)
+BROADCAST = ['windspeed', 'samplearea', 'samplefrequency', 'T']
+
+
+def IsRecords(data, binaxis=-1):
+    # True if data is records x bins (or a single record) already
+    ndim = np.ndim(data)
+    return ndim <= 1 or (ndim == 2 and binaxis in (-1, 1))
+
+
+def BinAxisApply(func, data, binaxis=-1, out=None, **kwargs):
+    # call func on data brought to records x bins, the results are brought
+    # back to the shape of data (see above), out is filled if given
+    data = np.moveaxis(np.asarray(data), binaxis, -1)
+    leading = data.shape[:-1]
+    nrecords = int(np.prod(leading))
+
+    for name in BROADCAST:
+        if kwargs.get(name) is None or np.size(kwargs[name]) == 1:
+            continue
+        kwargs[name] = np.broadcast_to(np.asarray(kwargs[name], dtype=float),
+                                       leading).reshape(nrecords)
+
+    result = func(data.reshape(nrecords, data.shape[-1]), **kwargs)
+    result = _restore(result, leading, binaxis)
+    if out is not None and not isinstance(result, (bool, list, tuple)):
+        out[...] = result
+        return out
+    return result
+
+
+def _restore(result, leading, binaxis):
+    if result is False or isinstance(result, list):
+        # e.g. the new binsizes of Gonser2011
+        return result
+    if isinstance(result, tuple):
+        return tuple(_restore(_, leading, binaxis) for _ in result)
+    result = np.asarray(result)
+    if result.ndim == 2:
+        return np.moveaxis(result.reshape(leading + result.shape[-1:]),
+                           -1, binaxis)
+    return result.reshape(leading)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Precomputed geometry of the bins (midpoints, radii, widths, droplet volumes)
+shared by LWC, ED, MVD and FluxGrav.
+
+A BinGeometry is created once per set of binsizes and afterwards taken
+from a cache, i.e. BinGeometry(binsizes) is cheap to call on every function
+call. The arrays are read only as they are shared between all users.
+
+Instead of the binsizes also the name of a preset can be given:
+    'CDP2'        default bins of the CDP-2 (2 to 50 micrometer, 30 bins)
+    'FM100'       the FM-100, run with the same default bins as the CDP-2
+    'Gonser2011'  bins after rebinning with Gonser2011
+    'Spiegel2012' bins after rebinning with Spiegel2012
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+# the 2 as first binsize is owed to the ADC treshold, which denotes
+# the lower binborder
+# binsizes are NOT the treshold values that are sent via setup cmd
+CDP2_BINSIZES = (2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16, 18, 20,
+                 22, 24, 26, 28, 30, 32, 34, 36, 38, 40, 42, 44, 46, 48, 50)
+
+# the FM-100 uses the same sizing electronics and is set up with the same
+# bin tresholds, change this if your instrument has a different table
+FM100_BINSIZES = CDP2_BINSIZES
+
+
+def PresetBinsizes(name):
+    # return the binsizes of an instrument or a rebinning by its name
+    key = name.upper().replace('-', '').replace('_', '')
+    if key in ['CDP', 'CDP2']:
+        return CDP2_BINSIZES
+    elif key in ['FM', 'FM100']:
+        return FM100_BINSIZES
+    elif key == 'GONSER2011':
+        from Gonser2011 import Gonser2011
+        return tuple(Gonser2011(getbins=True))
+    elif key == 'SPIEGEL2012':
+        from Spiegel2012 import Spiegel2012
+        return tuple(Spiegel2012(getbins=True))
+
+    raise ValueError('Unknown bin preset ' + name + ', use one of ' +
+                     'CDP2, FM100, Gonser2011 or Spiegel2012')
+
+
+class BinGeometry(object):
+    # all sizes are in micrometers, dropvolume is in cm^3 so that
+    # concentration in # / m^3 times dropvolume gives g / m^3 of water
+    __slots__ = ['binsizes', 'nbins', 'midpoints', 'widths', 'radii',
+                 'r2', 'r3', 'd2', 'd3', 'dropvolume']
+
+    _cache = {}
+
+    def __new__(cls, binsizes=CDP2_BINSIZES):
+        if isinstance(binsizes, cls):
+            return binsizes
+
+        if isinstance(binsizes, str):
+            binsizes = PresetBinsizes(binsizes)
+
+        key = tuple(float(_) for _ in np.ravel(binsizes))
+
+        geometry = cls._cache.get(key, None)
+        if geometry is not None:
+            return geometry
+
+        if len(key) < 2:
+            raise ValueError('binsizes need at least two bin borders')
+
+        binsizes = np.asarray(key)
+        midpoints = (binsizes[1:] + binsizes[:-1]) / 2
+        radii = midpoints / 2
+
+        values = {'binsizes': binsizes,
+                  'midpoints': midpoints,
+                  'widths': np.diff(binsizes),
+                  'radii': radii,
+                  'r2': radii**2,
+                  'r3': radii**3,
+                  'd2': midpoints**2,
+                  'd3': midpoints**3,
+                  'dropvolume': midpoints**3 * np.pi / 6 * 10**-12,
+                  }
+
+        geometry = object.__new__(cls)
+        for name, value in values.items():
+            value.flags.writeable = False
+            object.__setattr__(geometry, name, value)
+        object.__setattr__(geometry, 'nbins', midpoints.shape[0])
+
+        cls._cache[key] = geometry
+        return geometry
+
+    def __setattr__(self, name, value):
+        raise AttributeError('BinGeometry is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('BinGeometry is immutable')
+
+    def __reduce__(self):
+        # rebuild from the binsizes, e.g. when sent to another process
+        return (BinGeometry, (tuple(self.binsizes.tolist()),))
+
+    def __len__(self):
+        return self.nbins
+
+    def __repr__(self):
+        return ('BinGeometry(' + str(self.nbins) + ' bins from ' +
+                str(self.binsizes[0]) + ' to ' + str(self.binsizes[-1]) +
+                ' micrometer)')
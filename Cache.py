@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of the decoded counts and the results of day files, so a
+rerun with one changed setting only recalculates what depends on it.
+
+Every entry is addressed by a hash of what it was made from:
+    counts   hash of the file content, checksum_must_match, QC rules
+    results  key of the counts, windspeed, samplearea, samplefrequency,
+             rebinning, T, lat and asl
+plus a version per stage (CACHE_VERSIONS) that is increased whenever the
+decoding or the calculation changes. Windspeed and temperature given as a
+field name or a function (e.g. WindJoin) are evaluated first and their
+values go into the key, so a new wind series only recalculates the days
+where the wind changed, a new rebinning reuses the decoded counts of all
+days.
+
+The entries are npz files in cachedir, the cache is kept below maxbytes by
+removing the least recently used entries (a hit counts as use).
+
+    cache = ResultsCache('/data/cdp/cache', maxbytes=20 * 2**30)
+    result, failed = BatchProcess(files, cache=cache, rebin='Spiegel2012')
+
+A QualityControl given as qc only counts the rejections of the days whose
+counts were not in the cache.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from Pipeline import (CHUNKSIZE, RESULT_NAMES, ChunkBins, ChunkTime,
+                      FileValues, Rebinning, SettingsToken,
+                      _qualitycontrol)
+from ReadTOB1 import ReadTOB1Chunks
+
+# where the entries are stored by default
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'cdp', 'results')
+
+# size the cache is kept below by default in bytes
+CACHE_MAXBYTES = 2**32
+
+# increase when the output of a stage changes for the same inputs
+CACHE_VERSIONS = {'counts': 1, 'results': 1}
+
+# content hashes of files, keyed by path, size and modification time
+_HASHCACHE = {}
+
+
+def FileHash(filename, blocksize=2**20):
+    # sha1 of the content of a file, only read again if it changed
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    if key not in _HASHCACHE:
+        sha1 = hashlib.sha1()
+        with open(filename, 'rb') as fo:
+            for block in iter(lambda: fo.read(blocksize), b''):
+                sha1.update(block)
+        _HASHCACHE[key] = sha1.hexdigest()
+    return _HASHCACHE[key]
+
+
+def CacheKey(stage, **settings):
+    # hash of the stage, its version and the settings
+    token = repr((stage, CACHE_VERSIONS[stage], SettingsToken(settings)))
+    return hashlib.sha1(token.encode()).hexdigest()
+
+
+class ResultsCache:
+    # dicts of arrays stored as npz files in cachedir, at most maxbytes
+    def __init__(self, cachedir=CACHE_DIR, maxbytes=CACHE_MAXBYTES):
+        self.cachedir = cachedir
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return ('ResultsCache(' + repr(self.cachedir) + ', maxbytes=' +
+                str(self.maxbytes) + ')')
+
+    def path(self, key):
+        return os.path.join(self.cachedir, key + '.npz')
+
+    def get(self, key):
+        # the stored dict of arrays, None if there is none
+        filename = self.path(key)
+        try:
+            with np.load(filename) as stored:
+                entry = {name: stored[name] for name in stored.files}
+        except (OSError, ValueError, KeyError):
+            # missing, evicted in between or broken
+            self.misses += 1
+            return None
+        try:
+            # the modification time is the last use for the eviction
+            os.utime(filename)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        # store a dict of arrays, written to a temporary file first so a
+        # partial entry is never read
+        os.makedirs(self.cachedir, exist_ok=True)
+        filename = self.path(key)
+        tmpfile = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(tmpfile, 'wb') as fo:
+            np.savez(fo, **entry)
+        os.replace(tmpfile, filename)
+        self.evict()
+
+    def entries(self):
+        # (last use, size, filename) of all entries, oldest first
+        if not os.path.isdir(self.cachedir):
+            return []
+        entries = []
+        for name in os.listdir(self.cachedir):
+            if not name.endswith('.npz'):
+                continue
+            filename = os.path.join(self.cachedir, name)
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, filename))
+        return sorted(entries)
+
+    def size(self):
+        return sum(_[1] for _ in self.entries())
+
+    def evict(self):
+        # remove the least recently used entries until below maxbytes
+        entries = self.entries()
+        size = sum(_[1] for _ in entries)
+        for _, filesize, filename in entries:
+            if size <= self.maxbytes:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                # removed by another process in the meantime
+                pass
+            size -= filesize
+
+    def clear(self):
+        for _, _, filename in self.entries():
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+
+def _cache(cache):
+    # cache can be a ResultsCache or a directory
+    return cache if isinstance(cache, ResultsCache) else ResultsCache(cache)
+
+
+def CachedCounts(filename,
+                 cache=None,
+                 chunksize=CHUNKSIZE,
+                 checksum_must_match=False,
+                 qc=None,
+                 ):
+    # decoded bins, time and mask of the kept records of a day file, from
+    # the cache if the file and the settings did not change
+    cache = _cache(CACHE_DIR if cache is None else cache)
+    rules = None if qc is None else _qualitycontrol(qc).rules
+    key = CacheKey('counts', file=FileHash(filename),
+                   checksum_must_match=checksum_must_match, qc=rules)
+    counts = cache.get(key)
+    if counts is not None:
+        counts['key'] = key
+        return counts
+
+    if qc is not None:
+        qc = _qualitycontrol(qc)
+    bins, time, keep = [], [], []
+    for chunk in ReadTOB1Chunks(filename, chunksize=chunksize):
+        _bins, _keep = ChunkBins(chunk,
+                                 checksum_must_match=checksum_must_match,
+                                 qc=qc)
+        bins.append(np.asarray(_bins))
+        time.append(ChunkTime(chunk)[_keep])
+        keep.append(_keep)
+
+    counts = {'bins': np.concatenate(bins) if bins else
+              np.zeros((0, 30), dtype=np.uint32),
+              'time': np.concatenate(time) if time else np.zeros(0),
+              'keep': np.concatenate(keep) if keep else
+              np.zeros(0, dtype=bool)}
+    cache.put(key, counts)
+    counts['key'] = key
+    return counts
+
+
+def _values(values, filename, keep, chunksize):
+    # per record values (windspeed, T) of the kept records, fields and
+    # functions are evaluated on the chunks of the file
+    if not (callable(values) or isinstance(values, str)):
+        return values
+    return FileValues(values, filename, chunksize)[keep]
+
+
+def CachedProcessFile(filename,
+                      cache=None,
+                      chunksize=CHUNKSIZE,
+                      windspeed=[1],  # in m/s
+                      samplearea=0.298,  # as area in square millimeters
+                      samplefrequency=10,  # as Hz
+                      rebin=None,
+                      checksum_must_match=False,
+                      T=[20],  # in degree celsius
+                      lat=None,
+                      asl=0,
+                      qc=None,
+                      sparse=False,
+                      ):
+    # the same as Batch.ProcessFile without outdir (a dict with the
+    # RESULT_NAMES for all records of the file), but only the stages whose
+    # inputs changed are calculated
+    from ComputeAll import ComputeAll
+    cache = _cache(CACHE_DIR if cache is None else cache)
+    counts = CachedCounts(filename,
+                          cache=cache,
+                          chunksize=chunksize,
+                          checksum_must_match=checksum_must_match,
+                          qc=qc)
+    windspeed = _values(windspeed, filename, counts['keep'], chunksize)
+    T = _values(T, filename, counts['keep'], chunksize)
+
+    key = CacheKey('results', counts=str(counts['key']), windspeed=windspeed,
+                   samplearea=samplearea, samplefrequency=samplefrequency,
+                   rebin=rebin, T=T, lat=lat, asl=asl)
+    result = cache.get(key)
+    if result is not None:
+        return {name: result[name] for name in RESULT_NAMES}
+
+    matrix, binsizes = Rebinning(rebin)
+    bins = counts['bins']
+    nrecords = bins.shape[0]
+
+    def _rows(values, rows):
+        # per record values follow the rows, single values are kept
+        if values is None:
+            return None
+        values = np.asarray(values, dtype=float)
+        if values.ndim and values.shape[0] == nrecords:
+            return values[rows]
+        return values
+
+    # in chunks as StreamCampaign so the memory needed stays the same
+    results = []
+    for start in range(0, max(nrecords, 1), chunksize):
+        rows = slice(start, start + chunksize)
+        _bins = bins[rows]
+        if sparse:
+            from Sparse import SparseBins
+            _bins = SparseBins(_bins)
+        if matrix is not None:
+            from Rebin import Rebin
+            _bins = Rebin(_bins, matrix)
+        if _bins.shape[0] == 0:
+            results.append({name: np.zeros(0) for name in RESULT_NAMES
+                            if name != 'time'})
+            continue
+        _result = ComputeAll(_bins,
+                             windspeed=_rows(windspeed, rows),
+                             samplearea=samplearea,
+                             samplefrequency=samplefrequency,
+                             binsizes=binsizes,
+                             perbin=False,
+                             T=_rows(T, rows),
+                             lat=lat,
+                             asl=asl,
+                             )
+        if 'fluxgrav' not in _result:
+            # without T there is no gravitational flux, as in ProcessChunk
+            _result['fluxgrav'] = np.full(_bins.shape[0], np.nan)
+        results.append(_result)
+
+    result = {name: np.concatenate([_[name] for _ in results])
+              for name in RESULT_NAMES if name != 'time'}
+    result['time'] = counts['time']
+    result = {name: result[name] for name in RESULT_NAMES}
+    cache.put(key, result)
+    return result
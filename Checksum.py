@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checksum validation of raw CDP responses on whole arrays.
+
+The CDP sends as the last two bytes of a response the 16 bit sum of the
+154 bytes before, i.e. the byte sum as done by cdp_checksum_calculator on
+the logger. With cdp_checksum_must_match = 0 the logger keeps
+every record, so corrupt records have to be removed afterwards.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+from DecodeRaw import RawPackets, PACKET_LENGTH
+
+
+def CalcChecksum(packets):
+    # 16 bit byte sum of each raw response without the checksum itself
+    # packets is anything RawPackets understands
+    packets, _ = RawPackets(packets)
+    chksum = packets[:, :PACKET_LENGTH - 2].sum(axis=1, dtype=np.uint32)
+    return (chksum & 0xFFFF).astype(np.uint16)
+
+
+def ChecksumMask(data,
+                 returnfailed=False,
+                 quiet=True,
+                 field='dummy',
+                 chksumfield='cdp_data_cdp_chksum',
+                 calcfield='cdp_data_calc_chksum',
+                 ):
+    # returns a boolean mask which is True for records with a valid checksum
+    # data can be raw responses (see RawPackets) or the records of the
+    # cdp_data table, where only the raw checksum from the cdp and the one
+    # calculated on the logger are left to compare
+    # returnfailed=True returns the indices of the corrupt records as well
+    if (getattr(data, 'dtype', None) is not None and
+            data.dtype.names is not None and field not in data.dtype.names):
+        if (chksumfield not in data.dtype.names or
+                calcfield not in data.dtype.names):
+            raise KeyError('Need either ' + field + ' or ' + chksumfield +
+                           ' and ' + calcfield + ' to check the checksum')
+        mask = np.asarray(data[chksumfield]) == np.asarray(data[calcfield])
+    else:
+        packets, chksum = RawPackets(data, field=field,
+                                     chksumfield=chksumfield)
+        mask = CalcChecksum(packets) == chksum
+
+    failed = np.flatnonzero(~mask)
+
+    if failed.shape[0] and not quiet:
+        print('Warning from ChecksumMask():')
+        print(failed.shape[0], 'of', mask.shape[0],
+              'records have a wrong checksum, the first at index', failed[0])
+
+    return (mask, failed) if returnfailed else mask
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Single pass calculation of concentration, LWC, MVD and ED from bin counts.
+
+The pipeline MVD(LWC(ConcPerCCM(...))) creates a new full size array at
+every step. ComputeAll goes through the same steps, but reuses its buffers
+and can write into preallocated arrays given by out, so the memory used
+stays at about the input plus one (perbin=False) or two (perbin=True)
+arrays of the size of the bins.
+
+Units are the same as for the single functions:
+    conc, conc_total   # / cm^3           (ConcPerCCM)
+    lwc, lwc_total     g / m^3            (LWC with conc in # / m^3)
+    mvd, ed            micrometer         (MVD, ED)
+    fluxgrav           g / m^2 / s        (FluxGrav)
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+from BinGeometry import BinGeometry
+from ConcPerCCM import SampleVolume
+from DiameterQuantiles import DiameterQuantiles
+from FluxGrav import FluxGrav
+from Moments import Moments
+from Sparse import SparseBins, SparseApply
+
+
+def _output(out, name, shape):
+    # take the preallocated array from out or create a new one
+    if out is not None and out.get(name, None) is not None:
+        if out[name].shape != shape:
+            raise ValueError('out[' + name + '] needs the shape ' +
+                             str(shape) + ' but has ' + str(out[name].shape))
+        return out[name]
+    return np.empty(shape)
+
+
+def ComputeAll(bins,
+               windspeed=[1],  # in m/s
+               samplearea=0.298,  # as area in square millimeters
+               samplefrequency=10,  # as Hz
+               binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16, 18,
+                         20, 22, 24, 26, 28, 30, 32, 34, 36, 38, 40, 42, 44,
+                         46, 48, 50],
+               perbin=True,
+               out=None,
+               T=None,  # in degree celsius
+               lat=None,
+               asl=0,
+               ):
+    if isinstance(bins, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(ComputeAll, bins, out=out, windspeed=windspeed,
+                           samplearea=samplearea,
+                           samplefrequency=samplefrequency,
+                           binsizes=binsizes,
+                           perbin=perbin,
+                           T=T,
+                           lat=lat,
+                           asl=asl)
+
+    # returns a dict with conc_total, lwc_total, mvd and ed for each record
+    # and with perbin=True also conc and lwc for each bin
+    # if T is given also the gravitational flux fluxgrav (see FluxGrav)
+    # out can be a dict with (some of) the same keys holding preallocated
+    # arrays that are filled instead of creating new ones
+    # perbin=False reuses one buffer for concentration, lwc and mvd, in that
+    # case out['conc'] is used as buffer if given and holds the lwc after
+    geometry = BinGeometry(binsizes)
+    bins = np.asarray(bins)
+
+    if bins.ndim == 1:
+        bins = bins[np.newaxis, :]
+
+    if geometry.nbins != bins.shape[1]:
+        print('binsizes length must be one longer than length of bins')
+        return False
+
+    nrecords = bins.shape[0]
+    result = {}
+
+    # concentration per bin, # / cm^3
+    volume = SampleVolume(windspeed=windspeed,
+                          samplearea=samplearea,
+                          samplefrequency=samplefrequency)
+    conc = _output(out, 'conc', bins.shape)
+    np.divide(bins, volume[..., np.newaxis], out=conc)
+    np.nan_to_num(conc, copy=False)
+
+    result['conc_total'] = _output(out, 'conc_total', (nrecords,))
+    np.sum(conc, axis=1, out=result['conc_total'])
+
+    # ed only depends on the relative distribution, so it is taken from the
+    # bins directly as ED does
+    moments = Moments(bins, [2, 3], geometry)
+    r2, r3 = moments[:, 0], moments[:, 1]
+    r2[r2 == 0] = -1.0
+    result['ed'] = _output(out, 'ed', (nrecords,))
+    np.multiply(r3 / r2, 2, out=result['ed'])
+    result['ed'][result['ed'] <= 0] = 0
+
+    # lwc per bin, conc is converted to # / m^3 and times the droplet volume
+    if perbin:
+        result['conc'] = conc
+        lwc = _output(out, 'lwc', bins.shape)
+        np.multiply(conc, geometry.dropvolume * 10**6, out=lwc)
+        result['lwc'] = lwc
+    else:
+        lwc = conc
+        lwc *= geometry.dropvolume * 10**6
+
+    result['lwc_total'] = _output(out, 'lwc_total', (nrecords,))
+    np.sum(lwc, axis=1, out=result['lwc_total'])
+
+    if T is not None:
+        result['fluxgrav'] = FluxGrav(lwc, T=T, binsizes=geometry,
+                                      combined=True, lat=lat, asl=asl)
+
+    # the mvd is the 0.5 quantile of the lwc, done in blocks of records
+    result['mvd'] = DiameterQuantiles(lwc, 0.5, binsizes=geometry,
+                                      weights='lwc',
+                                      out=_output(out, 'mvd', (nrecords,)))
+
+    return result
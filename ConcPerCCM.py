@@ -6,20 +6,17 @@
 """
 
 
-def ConcPerCCM(bins,
-               windspeed=[1],  # in m/s
-               samplearea=0.298,  # as area in square millimeters
-               samplefrequency=10,  # as Hz
-               combined=True):
+def SampleVolume(windspeed=[1],  # in m/s
+                 samplearea=0.298,  # as area in square millimeters
+                 samplefrequency=10,  # as Hz
+                 ):
     import numpy as np
+    # the volume in cm^3 that passed the sample area during one sample
     # windspeed defaults to 1 meter per seconds windspeed
     # samplearea defaults to 0.298 as given by CDP specs
     # make cm/s out of it
-    windspeed = (
-        windspeed.copy()
-        if type(windspeed) == np.ndarray
-        else np.asarray(windspeed, dtype=np.float)
-    )
+    # no copy needed, the scaling below gives a new array anyway
+    windspeed = np.asarray(windspeed, dtype=float)
 
     # convert windspeed first to cm per s and then to cm adjusted to
     # sampling frequency, as we look for cm and we still have cm/s
@@ -38,18 +35,70 @@ def ConcPerCCM(bins,
               '\n Make sure all parameters are proper',
               '*' * 30)
 
-    samplearea /= 10**2  # make cm instead of millimeters out of it
-    volume = windspeed * samplearea  # make a volume out of it
+    # make cm instead of millimeters out of it (not in place, samplearea
+    # can be an array per record or station)
+    samplearea = np.asarray(samplearea, dtype=float) / 10**2
+    # make a volume out of it, at least 1d so that scalars work as well
+    volume = np.atleast_1d(windspeed * samplearea)
 
     # set volume to nan if its zero because then its not physically correct
     volume[volume == 0] = np.nan
 
-    if combined:
-        concperccm = np.nansum(bins, axis=1) / volume
-    else:
-        concperccm = bins / np.repeat(volume[:, np.newaxis],
-                                      bins.shape[1], axis=1)
+    return volume
+
+
+def ConcPerCCM(bins,
+               windspeed=[1],  # in m/s
+               samplearea=0.298,  # as area in square millimeters
+               samplefrequency=10,  # as Hz
+               combined=True,
+               n_jobs=1,
+               out=None,
+               binaxis=-1,
+               ):
+    import numpy as np
+    from BinAxis import BinAxisApply, IsRecords
+    from Parallel import ParallelRows, SliceRows
+    from Sparse import SparseBins, SparseApply
+    if isinstance(bins, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(ConcPerCCM, bins, out=out, windspeed=windspeed,
+                           samplearea=samplearea,
+                           samplefrequency=samplefrequency,
+                           combined=combined,
+                           n_jobs=n_jobs)
+    if not IsRecords(bins, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(ConcPerCCM, bins, binaxis, out=out,
+                            windspeed=windspeed,
+                            samplearea=samplearea,
+                            samplefrequency=samplefrequency,
+                            combined=combined,
+                            n_jobs=n_jobs)
+
+    # n_jobs > 1 (or None/-1 for all cores) works on blocks of records in
+    # threads, out can be a preallocated array for the result
+    volume = SampleVolume(windspeed=windspeed,
+                          samplearea=samplearea,
+                          samplefrequency=samplefrequency)
+    bins = np.atleast_2d(bins)
+    nrecords = max(bins.shape[0], volume.shape[0])
+
+    if out is None:
+        out = np.empty((nrecords,) if combined else
+                       (nrecords, bins.shape[1]))
+
+    def _kernel(rows):
+        _bins = SliceRows(bins, rows)
+        _volume = SliceRows(volume, rows)
+        if combined:
+            np.divide(np.nansum(_bins, axis=1), _volume, out=out[rows])
+        else:
+            # broadcast the volume over the bins instead of repeating it
+            np.divide(_bins, _volume[..., np.newaxis], out=out[rows])
+        # out is our own array, so this can be done in place
+        np.nan_to_num(out[rows], copy=False)
 
-    concperccm = np.nan_to_num(concperccm)
+    ParallelRows(_kernel, nrecords, n_jobs=n_jobs)
 
-    return concperccm
+    return out
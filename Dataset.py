@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A dataset of CDP records that calculates derived quantities on first use
+and keeps them, so nothing along the chain ConcPerCCM -> LWC -> MVD is
+calculated twice in an analysis session.
+
+The inputs (bins, windspeed, samplearea, samplefrequency, binsizes, T,
+lat, asl, wavelength) are given once with the same defaults for all
+functions (e.g. 10 Hz, where MVD alone would take 0.1 Hz). Changing an
+input drops everything that depends on it:
+
+    data = CDPDataset(bins, windspeed=ws)
+    data.mvd            # calculates conc -> lwc -> mvd
+    data.lwc_total      # reuses lwc
+    data.windspeed = newws
+    data.ed             # still cached, does not depend on the windspeed
+    data.mvd            # recalculated from the new conc and lwc
+
+Changing an input array in place cannot be noticed, call invalidate() in
+that case. bins can also be a SparseBins (see Sparse).
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+from BinGeometry import CDP2_BINSIZES
+from Mie import WATER_REFRACTIVEINDEX
+
+# inputs and their defaults
+DATASET_INPUTS = {'bins': None,
+                  'windspeed': [1],  # in m/s
+                  'samplearea': 0.298,  # as area in square millimeters
+                  'samplefrequency': 10,  # as Hz
+                  'binsizes': CDP2_BINSIZES,
+                  'T': [20],  # in degree celsius
+                  'lat': None,
+                  'asl': 0,
+                  'wavelength': 0.55,  # in micrometer
+                  'refractiveindex': WATER_REFRACTIVEINDEX,
+                  'n_jobs': 1,
+                  }
+
+# what each derived quantity is calculated from
+DATASET_DEPENDS = {
+    'conc': ['bins', 'windspeed', 'samplearea', 'samplefrequency',
+             'n_jobs'],
+    'conc_total': ['bins', 'windspeed', 'samplearea', 'samplefrequency'],
+    'lwc': ['conc', 'binsizes', 'n_jobs'],
+    'lwc_total': ['lwc'],
+    'mvd': ['lwc', 'binsizes', 'n_jobs'],
+    'ed': ['bins', 'binsizes'],
+    'fluxgrav': ['lwc', 'T', 'lat', 'asl', 'binsizes'],
+    'visibility': ['conc', 'binsizes', 'wavelength', 'refractiveindex'],
+}
+
+
+def _total(values):
+    # sum over the bins per record, also for SparseBins
+    from Sparse import SparseBins
+    if isinstance(values, SparseBins):
+        return values.scatter(np.nansum(values.counts, axis=1))
+    return np.nansum(values, axis=1)
+
+
+def _input(name):
+    def fget(self):
+        return self._inputs[name]
+
+    def fset(self, value):
+        self._inputs[name] = value
+        self.invalidate(name)
+
+    return property(fget, fset)
+
+
+def _derived(name):
+    return property(lambda self: self._get(name))
+
+
+class CDPDataset(object):
+    def __init__(self, bins, **kwargs):
+        unknown = set(kwargs) - set(DATASET_INPUTS)
+        if unknown:
+            raise TypeError('Unknown inputs ' + ', '.join(sorted(unknown)))
+        self._inputs = dict(DATASET_INPUTS)
+        self._inputs.update(kwargs)
+        self._inputs['bins'] = bins
+        self._cache = {}
+
+    def __repr__(self):
+        return ('CDPDataset(' + str(self.bins.shape[0]) + ' records, ' +
+                'cached: ' + ', '.join(sorted(self._cache)) + ')')
+
+    def dependents(self, name):
+        # all derived quantities that depend (indirectly) on name
+        found = set()
+        todo = [name]
+        while todo:
+            current = todo.pop()
+            for derived, depends in DATASET_DEPENDS.items():
+                if current in depends and derived not in found:
+                    found.add(derived)
+                    todo.append(derived)
+        return found
+
+    def invalidate(self, name=None):
+        # drop the cached quantities depending on the input name, or all
+        if name is None:
+            self._cache.clear()
+            return
+        for derived in self.dependents(name) | {name}:
+            self._cache.pop(derived, None)
+
+    def cached(self):
+        # names of the quantities calculated so far
+        return sorted(self._cache)
+
+    def _get(self, name):
+        if name not in self._cache:
+            self._cache[name] = getattr(self, '_' + name)()
+        return self._cache[name]
+
+    def _conc(self):
+        from ConcPerCCM import ConcPerCCM
+        return ConcPerCCM(self.bins,
+                          windspeed=self.windspeed,
+                          samplearea=self.samplearea,
+                          samplefrequency=self.samplefrequency,
+                          combined=False,
+                          n_jobs=self.n_jobs)
+
+    def _conc_total(self):
+        from ConcPerCCM import ConcPerCCM
+        return ConcPerCCM(self.bins,
+                          windspeed=self.windspeed,
+                          samplearea=self.samplearea,
+                          samplefrequency=self.samplefrequency,
+                          combined=True)
+
+    def _lwc(self):
+        from LWC import LWC
+        from Sparse import SparseBins
+        conc = self.conc
+        # LWC takes the concentration in # / m^3
+        if isinstance(conc, SparseBins):
+            conc = conc.like(conc.counts * 10**6)
+        else:
+            conc = conc * 10**6
+        return LWC(conc,
+                   binsizes=self.binsizes,
+                   combined=False,
+                   n_jobs=self.n_jobs)
+
+    def _lwc_total(self):
+        return _total(self.lwc)
+
+    def _mvd(self):
+        from MVD import MVD
+        return MVD(self.lwc, binsizes=self.binsizes, n_jobs=self.n_jobs)
+
+    def _ed(self):
+        from ED import ED
+        return ED(self.bins, binsizes=self.binsizes)
+
+    def _fluxgrav(self):
+        from FluxGrav import FluxGrav
+        return FluxGrav(self.lwc,
+                        T=self.T,
+                        binsizes=self.binsizes,
+                        combined=True,
+                        lat=self.lat,
+                        asl=self.asl)
+
+    def _visibility(self):
+        from conc2visibility import conc2visibility
+        return conc2visibility(self.conc,
+                               binsizes=self.binsizes,
+                               wavelength=self.wavelength,
+                               refractiveindex=self.refractiveindex)
+
+    def results(self, names=['conc_total', 'lwc_total', 'mvd', 'ed']):
+        # dict of the given quantities (calculated if needed)
+        return {name: getattr(self, name) for name in names}
+
+
+# the inputs can be set (and drop what depends on them), the derived
+# quantities are calculated on first access
+for _name in DATASET_INPUTS:
+    setattr(CDPDataset, _name, _input(_name))
+for _name in DATASET_DEPENDS:
+    setattr(CDPDataset, _name, _derived(_name))
+del _name
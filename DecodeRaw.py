@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Decoder for the raw 156 byte responses of the CDP as stored in the
+cdp_data_raw table (cdp_process = 0 in CDP_Communications.cr3) or as
+received directly over the serial port.
+
+This does the same as the MoveBytes part and cdp_convert_housekeeping of
+the logger program, but on all records at once by looking at the packets
+through strided numpy views instead of shuffling single bytes.
+
+Layout of a response (16 bit words are LSB first, 32 bit counts are
+given as two 16 bit words with the high word first, for the bins the
+logger takes the high word MSB first):
+    bytes   0 -  15: 8 housekeeping channels (uint16)
+    bytes  16 -  19: DOF reject count (uint32)
+    bytes  20 -  29: 5 quality values (uint16)
+    bytes  30 -  33: ADC overflow count (uint32)
+    bytes  34 - 153: 30 bin counts (uint32)
+    bytes 154 - 155: checksum (uint16)
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+# length of a response to the data command 0x1B021D00
+PACKET_LENGTH = 156
+
+# names as used for the aliases in the cdp_data table of the logger
+HOUSEKEEPING_NAMES = ['Current_Laser_mA',
+                      'Monitor_Dump_Spot',
+                      'Wingboard_T',
+                      'Laser_T',
+                      'Sizer_Baseline',
+                      'Qualifier_Baseline',
+                      'Monitor_5V',
+                      'Control_Board_T',
+                      ]
+
+QUALITY_NAMES = ['qual_bandwdith',
+                 'qual_treshold',
+                 'avg_transit',
+                 'dt_bandwidth',
+                 'dynamic_treshold',
+                 ]
+
+
+def RawPackets(data, field='dummy', chksumfield='cdp_data_cdp_chksum'):
+    # bring the possible inputs into a records x 156 bytes view and
+    # return it together with the checksum sent by the cdp
+    #  - bytes/bytearray/memoryview as read from the serial port
+    #  - uint8 arrays with 156 bytes per record
+    #  - the structured array of the cdp_data_raw table from ReadTOB1
+    #  - the records x 39 dummy array (UINT4, MSB first as on the logger)
+    chksum = None
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = np.frombuffer(data, dtype=np.uint8)
+
+    if data.dtype.names is not None:
+        if chksumfield in data.dtype.names:
+            chksum = np.asarray(data[chksumfield], dtype=np.uint16)
+        data = data[field]
+
+    if data.dtype != np.uint8:
+        # UINT4 of the logger are MSB first, as the serial bytes were read
+        # into the longs in the order they came this gives the packet bytes
+        if data.dtype != np.dtype('>u4') or data.strides[-1] != 4:
+            data = np.ascontiguousarray(data, dtype='>u4')
+        data = data.view(np.uint8)
+
+    if data.ndim == 1:
+        if data.shape[0] % PACKET_LENGTH:
+            raise ValueError('Length of raw data is not a multiple of ' +
+                             str(PACKET_LENGTH))
+        data = data.reshape(-1, PACKET_LENGTH)
+
+    if data.shape[-1] != PACKET_LENGTH:
+        raise ValueError('Raw records need ' + str(PACKET_LENGTH) +
+                         ' bytes, got ' + str(data.shape[-1]))
+
+    if chksum is None:
+        # the checksum is the last word of the packet, LSB first
+        chksum = (data[:, 155].astype(np.uint16) << 8) | data[:, 154]
+
+    return data, chksum
+
+
+def _words(packets, dtype='<u2'):
+    # view the packet bytes as uint16 without copying
+    if packets.strides[-1] != 1:
+        packets = np.ascontiguousarray(packets)
+    return packets.view(dtype)
+
+
+def _longs(highwords, lowwords, start, n=1):
+    # combine two uint16 words (high word first) to a uint32 count
+    high = highwords[:, start:start + 2 * n:2].astype(np.uint32)
+    low = lowwords[:, start + 1:start + 2 * n:2]
+    high <<= 16
+    high |= low
+    return high
+
+
+def ConvertHousekeeping(raw):
+    # vectorised version of cdp_convert_housekeeping of the logger program
+    # raw is records x 8 of the raw housekeeping counts
+    raw = np.asarray(raw, dtype=np.float64)
+    cal = np.empty(raw.shape, dtype=np.float64)
+
+    # laser current converted [mA]
+    cal[:, 0] = 0.061 * raw[:, 0]
+
+    # dump spot monitor [V]
+    cal[:, 1] = raw[:, 1] * (5 / 4095)
+
+    # wingboard and laser temp [°C] from the thermistor voltage,
+    # kept with -273 as on the logger so both give the same result
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volt = raw[:, 2:4] * (5 / 4095)
+        cal[:, 2:4] = ((np.log(5 / volt - 1) / 3750 + 1 / 298) ** -1) - 273
+
+    # quality tresholds [V]
+    cal[:, 4:6] = raw[:, 4:6] * (5 / 4095)
+
+    # voltage monitor [V], is multiplied by two since it was divided
+    # by two to fit within the range
+    cal[:, 6] = raw[:, 6] * ((2 * 5) / 4095)
+
+    # control board temperature [°C]
+    cal[:, 7] = (raw[:, 7] ** 2 * (-8.60917 * 10**-7) +
+                 raw[:, 7] * (-0.047819) + 153.973)
+
+    return cal
+
+
+def DecodeRaw(data,
+              convert=True,
+              checksum_must_match=False,
+              field='dummy',
+              chksumfield='cdp_data_cdp_chksum',
+              backend=None,
+              ):
+    # decode raw cdp responses into the variables of the cdp_data table
+    # returns a dict with the field names of the cdp_data table, the bins
+    # are given as records x 30 array under cdp_data_bincount
+    # convert=False returns the raw housekeeping counts instead of
+    # the converted values
+    # checksum_must_match=True drops the records with a wrong checksum
+    # before decoding them, as cdp_checksum_must_match does on the logger
+    # backend 'numba' gets the checksum and bins in one go over the bytes
+    # of each packet (see Kernels)
+    from Checksum import CalcChecksum
+    from Kernels import Backend, JitDecodeBins
+
+    packets, chksum = RawPackets(data, field=field, chksumfield=chksumfield)
+    bincounts = None
+    if Backend(backend) == 'numba':
+        bincounts, calcchksum = JitDecodeBins(packets)
+    else:
+        calcchksum = CalcChecksum(packets)
+
+    if checksum_must_match:
+        valid = calcchksum == chksum
+        packets = packets[valid]
+        chksum = chksum[valid]
+        calcchksum = calcchksum[valid]
+        if bincounts is not None:
+            bincounts = bincounts[valid]
+
+    words = _words(packets)
+
+    housekeeping = words[:, 0:8]
+    if convert:
+        housekeeping = ConvertHousekeeping(housekeeping)
+
+    decoded = {name: housekeeping[:, _]
+               for _, name in enumerate(HOUSEKEEPING_NAMES)}
+    decoded['DOF_Reject'] = _longs(words, words, 8)[:, 0]
+
+    quality = words[:, 10:15].astype(np.float32)
+    decoded.update({name: quality[:, _]
+                    for _, name in enumerate(QUALITY_NAMES)})
+
+    decoded['ADC_Overflow'] = _longs(words, words, 15)[:, 0]
+
+    # the logger moves the high word of the bins MSB first (see the bin
+    # loop in CDP_Communications.cr3), this is kept to give the same counts
+    # as the cdp_data table; at 10 Hz the high word is zero anyway
+    if bincounts is None:
+        bincounts = _longs(_words(packets, '>u2'), words, 17, 30)
+    decoded['cdp_data_bincount'] = bincounts
+    decoded['cdp_data_cdp_chksum'] = chksum
+    decoded['cdp_data_calc_chksum'] = calcchksum
+
+    return decoded
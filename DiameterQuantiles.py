@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Interpolated diameter quantiles (e.g. D10, D50 = MVD, D90) of size
+distributions for many records at once.
+
+For every record the cumulative distribution over the bins is built once,
+the bin where it reaches a quantile is found by counting the bins below
+the quantile (a searchsorted per record) and the diameter is interpolated
+within that bin as in PADS Vers. 3.6.3:
+    b_i + (b_i+1 - b_i) * (q - cum_i-1) / pro_i
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+from BinGeometry import BinGeometry
+from Kernels import Backend, JitQuantiles
+
+# number of records handled at once, limits the size of the scratch arrays
+BLOCKSIZE = 2**16
+
+
+def DiameterQuantiles(inputdata,
+                      quantiles=[0.1, 0.5, 0.9],
+                      binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14,
+                                16, 18, 20, 22, 24, 26, 28, 30, 32, 34, 36,
+                                38, 40, 42, 44, 46, 48, 50],
+                      weights='lwc',
+                      out=None,
+                      blocksize=BLOCKSIZE,
+                      backend=None,
+                      ):
+    # inputdata is records x bins, returns records x quantiles in micrometer
+    # (or only records if a single quantile is given as a number)
+    # weights gives what the quantiles refer to
+    #   'lwc'    inputdata is the lwc per bin (MVD is the 0.5 quantile)
+    #   'volume' inputdata are counts/concentrations, weighted by the
+    #            droplet volume to give the same as 'lwc'
+    #   'number' inputdata are counts/concentrations, number quantiles
+    # records without anything in the bins get 0, negative values and nan
+    # in the bins are ignored
+    # backend 'numba' uses the compiled kernel of Kernels (see there)
+    geometry = BinGeometry(binsizes)
+    inputdata = np.asarray(inputdata)
+
+    if inputdata.ndim == 1:
+        inputdata = inputdata[np.newaxis, :]
+
+    if geometry.nbins != inputdata.shape[1]:
+        print('binsizes length must be one longer than length of bins')
+        return False
+
+    single = np.ndim(quantiles) == 0
+    quantiles = np.atleast_1d(np.asarray(quantiles, dtype=float))
+    if np.any((quantiles < 0) | (quantiles > 1)):
+        raise ValueError('quantiles must be between 0 and 1')
+
+    if weights == 'volume':
+        factor = geometry.dropvolume
+    elif weights in ['lwc', 'number']:
+        factor = None
+    else:
+        raise ValueError('weights must be lwc, volume or number')
+
+    nrecords, nbins = inputdata.shape
+    if out is None:
+        out = np.empty((nrecords, quantiles.shape[0]))
+    out2d = out.reshape(nrecords, quantiles.shape[0])
+
+    if Backend(backend) == 'numba':
+        # one pass over each record with the crossing search as a loop
+        JitQuantiles(inputdata, quantiles, geometry, factor, out2d)
+        return out2d[:, 0] if single and out.ndim != 1 else out
+
+    blocksize = max(1, min(blocksize, nrecords))
+    dist = np.empty((blocksize, nbins))
+    cum = np.empty((blocksize, nbins))
+    binsizes = geometry.binsizes
+    widths = geometry.widths
+
+    for start in range(0, nrecords, blocksize):
+        block = inputdata[start:start + blocksize]
+        nrows = block.shape[0]
+        ix = np.arange(nrows)[:, np.newaxis]
+
+        # fmax takes care of nan and negative values at the same time
+        _dist = np.fmax(block, 0, out=dist[:nrows])
+        if factor is not None:
+            _dist *= factor
+        _cum = np.cumsum(_dist, axis=1, out=cum[:nrows])
+        targets = _cum[:, -1:] * quantiles
+
+        # index of the first bin where the cumulative sum reaches the target
+        crossing = np.count_nonzero(
+            _cum[:, :, np.newaxis] < targets[:, np.newaxis, :], axis=1)
+        np.minimum(crossing, nbins - 1, out=crossing)
+
+        before = _cum[ix, crossing - 1]
+        before[crossing == 0] = 0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = (binsizes[crossing] + widths[crossing] *
+                      (targets - before) / _dist[ix, crossing])
+
+        # a quantile of 0 (or an empty bin at the crossing) is the lower
+        # border of the bin, no water/droplets at all gives 0
+        result[~np.isfinite(result)] = binsizes[crossing][
+            ~np.isfinite(result)]
+        result[~(_cum[:, -1] > 0)] = 0
+        out2d[start:start + nrows] = result
+
+    if single and out.ndim != 1:
+        return out2d[:, 0]
+    return out
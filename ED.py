@@ -11,31 +11,42 @@ def ED(bins,
        # the lower binborder
        binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16, 18, 20,
                  22, 24, 26, 28, 30, 32, 34, 36, 38, 40, 42, 44, 46, 48, 50],
-       binsize_as_diameter=True):
+       binsize_as_diameter=True,
+       binaxis=-1):
     import numpy as np
+    from BinAxis import BinAxisApply, IsRecords
+    from BinGeometry import BinGeometry
+    from Moments import Moments
+    from Sparse import SparseBins, SparseApply
+    if isinstance(bins, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(ED, bins, binsizes=binsizes,
+                           binsize_as_diameter=binsize_as_diameter)
+    if not IsRecords(bins, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(ED, bins, binaxis, binsizes=binsizes,
+                            binsize_as_diameter=binsize_as_diameter)
+
+    # binsizes can also be a BinGeometry or the name of a preset
+    geometry = BinGeometry(binsizes)
+    bins = np.atleast_2d(bins)
+
     # binsizes are NOT the treshold values that are sent via setup cmd
-    if len(binsizes) < bins.shape[1]:
-        print('binsizes length must be at least one longer than bins length')
+    if geometry.nbins != bins.shape[1]:
+        print('binsizes length must be one longer than length of bins')
         return False
 
-    midpoints = [(binsizes[_+1]+binsizes[_])/2 for _ in range(len(binsizes)-1)]
-    if binsize_as_diameter:
-        midpoints = [midpoint/2 for midpoint in midpoints]
-
-    _r2 = np.zeros(bins.shape)
-    _r3 = np.zeros(bins.shape)
-
-    # midpoints divided by 1000 as a security precaution of float overflow
-    for mno, midp in enumerate(midpoints):
-        _r2[:, mno] = bins[:, mno].squeeze() * midp**2
-        _r3[:, mno] = bins[:, mno].squeeze() * midp**3
+    # 2nd and 3rd moment with one multiplication of the bins with the
+    # powers of the midpoints (radius, or diameter if binsize_as_diameter
+    # is False)
+    _moments = Moments(bins, [2, 3], geometry, radius=binsize_as_diameter)
 
     # set stuff with zero to -1 so we know that negative numbers
     # which are not possible here were once zero and can be set to that after
     # the division
 
-    _r2 = np.nansum(_r2, axis=1)
-    _r3 = np.nansum(_r3, axis=1)
+    _r2 = _moments[:, 0]
+    _r3 = _moments[:, 1]
     _r2[_r2 == 0] = -1.0
     ed = _r3/_r2 * 2
     ed[ed < 0] = 0
@@ -13,31 +13,54 @@ def FluxGrav(lwc,
              lat=None,
              asl=0,
              latisrad=False,
+             binaxis=-1,
              ):
 
     import numpy as np
-    from mcr.met.constants.gravity import gravity
-    from mcr.met.density.airdensity import airdensity
-    from mcr.met.density.waterdensity import waterdensity
-    from mcr.met.constants.viscosityair import viscosityair
+    from BinAxis import BinAxisApply, IsRecords
+    from BinGeometry import BinGeometry
+    from Meteo import gravity, airdensity, waterdensity, viscosityair
+    from Sparse import SparseBins, SparseApply
+    if isinstance(lwc, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(FluxGrav, lwc, T=T,
+                           binsizes=binsizes,
+                           combined=combined,
+                           lat=lat,
+                           asl=asl,
+                           latisrad=latisrad)
+    if not IsRecords(lwc, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(FluxGrav, lwc, binaxis, T=T,
+                            binsizes=binsizes,
+                            combined=combined,
+                            lat=lat,
+                            asl=asl,
+                            latisrad=latisrad)
 
     # get gravity, possibly adjusted to latitude and elevation asl
+    # (only calculated once per lat/asl)
     g = gravity(lat=lat, asl=asl, latisrad=latisrad)
 
     if g >= 0:
         g *= -1
 
-    # midpoints are in micrometers, i.e. to scale to meters we need 10**-6 here
-    midpoints = [(binsizes[_+1]+binsizes[_])/2 * 10**-6
-                 for _ in range(len(binsizes)-1)]
+    # binsizes can also be a BinGeometry or the name of a preset
+    geometry = BinGeometry(binsizes)
 
-    midpoints = np.asarray(midpoints)
+    # midpoints are in micrometers, i.e. to scale the squared midpoints
+    # to meters we need 10**-12 here
+    midpoints2 = geometry.d2 * 10**-12
     # diameter is double the radius, but we already have diameter.
     # dropletdiameter = np.asarray(midpoints)*2
 
     # just make it an array.. ffs
-    if type(T) in [list, range]:
-        T = np.asarray(T)
+    T = np.asarray(T, dtype=float)
+
+    # a timeseries of temperatures (one per record) is broadcast over the
+    # bins, a single temperature or records x bins are used as they are
+    if T.ndim == 1 and T.shape[0] > 1:
+        T = T[:, np.newaxis]
 
     # ccalculate density difference
     rho_water = waterdensity(T)
@@ -50,7 +73,7 @@ def FluxGrav(lwc,
     # Ann. Geophys. 27, 3571–3576 (2009).
     # the original formula in Beswick 1991) employs the radius and this is
     # the diameter derived version
-    sedspeed = -g * midpoints**2 * (rho_water - rho_air) / 18 / muair
+    sedspeed = -g * midpoints2 * (rho_water - rho_air) / 18 / muair
 
     gravflux = lwc * sedspeed
 
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Optional numba kernels for the loops that numpy expresses poorly: the
+crossing search of DiameterQuantiles/MVD, the rebinning with the weight
+table of Gonser2011/Spiegel2012 and the byte moving (MoveBytes) of the raw
+packets in DecodeRaw.
+
+Each kernel goes once over a record, fuses the steps numpy does in
+separate passes (e.g. checksum and bins of a packet) and works on the
+records in parallel (prange). numba is optional: with the default backend
+'auto' the kernels are used if numba can be imported and the numpy code
+otherwise. The backend is chosen per call (backend='numpy'/'numba') or
+for all calls with Kernels.BACKEND:
+
+    import Kernels
+    Kernels.BACKEND = 'numpy'
+
+The kernels are plain python functions, compiled on first use, and give
+the same results as the numpy code (the rebinning up to the summation
+order of the matrix multiplication).
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+try:
+    import numba
+    prange = numba.prange
+except ImportError:
+    numba = None
+    prange = range
+
+BACKENDS = ['auto', 'numpy', 'numba']
+
+# backend of the calls that do not give one
+BACKEND = 'auto'
+
+# compiled kernels, only compiled once per session (and cached on disk)
+_COMPILED = {}
+
+
+def Backend(backend=None):
+    # the backend (numpy or numba) to use for backend (None for BACKEND)
+    backend = BACKEND if backend is None else backend
+    if backend not in BACKENDS:
+        raise ValueError('backend must be one of ' + ', '.join(BACKENDS))
+    if backend == 'auto':
+        return 'numpy' if numba is None else 'numba'
+    if backend == 'numba' and numba is None:
+        raise ImportError('The numba backend needs numba to be installed')
+    return backend
+
+
+def _compiled(kernel):
+    if kernel not in _COMPILED:
+        # error_model numpy gives inf/nan for a division by zero as numpy
+        _COMPILED[kernel] = numba.njit(parallel=True, cache=True,
+                                       error_model='numpy')(kernel)
+    return _COMPILED[kernel]
+
+
+def _quantiles(data, quantiles, binsizes, widths, factor, out):
+    # same steps as the numpy code of DiameterQuantiles for each record
+    nrecords, nbins = data.shape
+    for row in prange(nrecords):
+        dist = np.empty(nbins)
+        cum = np.empty(nbins)
+        total = 0.
+        for ix in range(nbins):
+            value = data[row, ix]
+            # nan and negative values are ignored
+            if not value > 0:
+                value = 0.
+            value *= factor[ix]
+            dist[ix] = value
+            total += value
+            cum[ix] = total
+
+        for iq in range(quantiles.shape[0]):
+            if not total > 0:
+                out[row, iq] = 0.
+                continue
+            target = total * quantiles[iq]
+            # first bin where the cumulative sum reaches the target
+            crossing = 0
+            while crossing < nbins - 1 and cum[crossing] < target:
+                crossing += 1
+            before = cum[crossing - 1] if crossing > 0 else 0.
+            result = (binsizes[crossing] + widths[crossing] *
+                      (target - before) / dist[crossing])
+            if not np.isfinite(result):
+                result = binsizes[crossing]
+            out[row, iq] = result
+
+
+def _rebin(bincounts, indptr, indices, weights, out):
+    # new bin j is the weighted sum of the old bins indices[indptr[j]:
+    # indptr[j + 1]], nan in an old bin only reaches the new bins it is in
+    nrecords = bincounts.shape[0]
+    nnew = indptr.shape[0] - 1
+    for row in prange(nrecords):
+        for new in range(nnew):
+            total = 0.
+            for ix in range(indptr[new], indptr[new + 1]):
+                total += bincounts[row, indices[ix]] * weights[ix]
+            out[row, new] = total
+
+
+def _decodebins(packets, bincounts, chksum):
+    # checksum and bins of each packet in one go over its bytes
+    nrecords = packets.shape[0]
+    for row in prange(nrecords):
+        total = 0
+        for ix in range(154):
+            total += int(packets[row, ix])
+        chksum[row] = total & 0xFFFF
+        for ix in range(30):
+            start = 34 + 4 * ix
+            # high word MSB first as on the logger, low word LSB first
+            high = (int(packets[row, start]) << 8) | int(packets[row,
+                                                               start + 1])
+            low = int(packets[row, start + 2]) | (int(packets[row,
+                                                              start + 3]) << 8)
+            bincounts[row, ix] = (high << 16) | low
+
+
+def _kernel(kernel, backend):
+    # the compiled kernel, or the python function for backend='python'
+    # (slow, only to check the kernels without numba)
+    return kernel if backend == 'python' else _compiled(kernel)
+
+
+def JitQuantiles(inputdata, quantiles, geometry, factor=None, out=None,
+                 backend='numba'):
+    # records x quantiles of inputdata (records x bins) as DiameterQuantiles
+    # with factor the weight per bin (droplet volume) or None
+    inputdata = np.asarray(inputdata, dtype=np.float64)
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+    if factor is None:
+        factor = np.ones(geometry.nbins)
+    if out is None:
+        out = np.empty((inputdata.shape[0], quantiles.shape[0]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        _kernel(_quantiles, backend)(inputdata, quantiles,
+                                     np.asarray(geometry.binsizes, float),
+                                     np.asarray(geometry.widths, float),
+                                     np.asarray(factor, dtype=np.float64),
+                                     out)
+    return out
+
+
+def JitRebin(bincounts, matrix, backend='numba'):
+    # bincounts (... x old bins) @ matrix (old x new bins), going only over
+    # the non zero weights of each new bin
+    bincounts = np.asarray(bincounts, dtype=np.float64)
+    leading = bincounts.shape[:-1]
+    bincounts = bincounts.reshape(-1, bincounts.shape[-1])
+
+    columns = np.asarray(matrix, dtype=np.float64).T
+    nonzero = columns != 0
+    indptr = np.zeros(columns.shape[0] + 1, dtype=np.intp)
+    np.cumsum(np.count_nonzero(nonzero, axis=1), out=indptr[1:])
+    indices = np.nonzero(nonzero)[1].astype(np.intp)
+    weights = columns[nonzero]
+
+    out = np.empty((bincounts.shape[0], columns.shape[0]))
+    _kernel(_rebin, backend)(bincounts, indptr, indices, weights, out)
+    return out.reshape(leading + (columns.shape[0],))
+
+
+def JitDecodeBins(packets, backend='numba'):
+    # bins (records x 30, uint32) and calculated checksums of records x 156
+    # packet bytes, as DecodeRaw and CalcChecksum give them
+    packets = np.ascontiguousarray(packets, dtype=np.uint8)
+    bincounts = np.empty((packets.shape[0], 30), dtype=np.uint32)
+    chksum = np.empty(packets.shape[0], dtype=np.uint16)
+    _kernel(_decodebins, backend)(packets, bincounts, chksum)
+    return bincounts, chksum
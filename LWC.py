@@ -16,9 +16,38 @@ def LWC(inputdata, # needs to be in # / m^3
         samplefrequency=10,
         combined=True,
         quiet=True,
+        n_jobs=1,
+        out=None,
+        binaxis=-1,
         ):
     import numpy as np
-    inputdata = inputdata.copy()
+    from BinAxis import BinAxisApply, IsRecords
+    from BinGeometry import BinGeometry
+    from Parallel import ParallelRows
+    from Sparse import SparseBins, SparseApply
+    if isinstance(inputdata, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(LWC, inputdata, out=out, data_is_conc=data_is_conc,
+                           binsizes=binsizes,
+                           windspeed=windspeed,
+                           samplearea=samplearea,
+                           samplefrequency=samplefrequency,
+                           combined=combined,
+                           quiet=quiet,
+                           n_jobs=n_jobs)
+    if not IsRecords(inputdata, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(LWC, inputdata, binaxis, out=out,
+                            data_is_conc=data_is_conc,
+                            binsizes=binsizes,
+                            windspeed=windspeed,
+                            samplearea=samplearea,
+                            samplefrequency=samplefrequency,
+                            combined=combined,
+                            quiet=quiet,
+                            n_jobs=n_jobs)
+
+    # inputdata is never changed in place, so it does not need a copy
     # binsizes are NOT the treshold values that are sent via setup cmd
     if not data_is_conc:
         from ConcPerCCM import ConcPerCCM
@@ -27,38 +56,55 @@ def LWC(inputdata, # needs to be in # / m^3
                           samplearea=samplearea,
                           samplefrequency=samplefrequency,
                           combined=False,
+                          n_jobs=n_jobs,
                           )
         # if you have given bins directly, ConcPerCCM will give you back #/cm^3
         # which we need to scale for the LWC
 
         # convert the concentration from cm^3 (default) to m^3
         # as we get per cm^3 from ConcPerCCM (as the name implies)
-        _lwc *= 10**6
+        scale = 10**6
 
     else:
-        _lwc = np.asarray(inputdata, np.float)
+        _lwc = np.asarray(inputdata, float)
+        scale = None
+
+    # binsizes can also be a BinGeometry or the name of a preset
+    geometry = BinGeometry(binsizes)
 
-    if len(binsizes) < _lwc.shape[1]:
+    if geometry.nbins != _lwc.shape[1]:
         print('binsizes length must be one longer than length of bins')
         return False
 
-    # midpoints are in micrometers
-    midpoints = [sum(_)/2 for _ in zip(binsizes[1:], binsizes[:-1])]
-
-    dropsize = [(midpoint)**3 * np.pi/6 * 10**-12 for midpoint in midpoints]
+    # volume of the droplets at the midpoints (in micrometers) in cm^3
+    dropsize = geometry.dropvolume
 
-    dropsize = np.asarray(dropsize)
-
-    if np.nanmax(_lwc) > 200000 and not quiet:
+    if not quiet and np.nanmax(_lwc) * (scale or 1) > 200000:
         print('Warning from LWC():')
         print('Are you sure the concentration is in # / m^3?')
-        print('It seems somewhat high with a max of', np.nanmax(_lwc))
+        print('It seems somewhat high with a max of',
+              np.nanmax(_lwc) * (scale or 1))
+
+    if out is None:
+        if combined:
+            out = np.empty(_lwc.shape[0])
+        else:
+            # the concentration calculated above is our own array
+            out = _lwc if scale is not None else np.empty(_lwc.shape)
 
-    if type(_lwc) != np.ndarray:
-        _lwc = np.asarray(_lwc, dtype=np.float)
+    def _kernel(rows):
+        # works on n_jobs blocks of records, see ConcPerCCM
+        _block = _lwc[rows]
+        if scale is not None:
+            _block = np.multiply(_block, scale,
+                                 out=None if combined else out[rows])
+        # choose either the sum of bins for a record or the single bins
+        if combined:
+            np.nansum(_block * dropsize, axis=1, out=out[rows])
+        else:
+            np.multiply(_block, dropsize, out=out[rows])
 
-    _lwc = (_lwc * dropsize)
+    ParallelRows(_kernel, _lwc.shape[0], n_jobs=n_jobs)
 
-    # choose either the sum of bins for a record or the single bins
-    return np.nansum(_lwc, axis=1) if combined else _lwc
+    return out
 
@@ -13,13 +13,43 @@ def MVD(inputdata,
         windspeed=[1],  # in m/s
         samplearea=0.298,  # as area in square millimeters
         samplefrequency=0.1,
+        n_jobs=1,
+        out=None,
+        binaxis=-1,
         ):
     import numpy as np
+    from BinAxis import BinAxisApply, IsRecords
+    from BinGeometry import BinGeometry
+    from ConcPerCCM import ConcPerCCM
+    from DiameterQuantiles import DiameterQuantiles
+    from LWC import LWC
+    from Parallel import ParallelRows
+    from Sparse import SparseBins, SparseApply
+    if isinstance(inputdata, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(MVD, inputdata, out=out, data_is_lwc=data_is_lwc,
+                           data_is_conc=data_is_conc,
+                           binsizes=binsizes,
+                           windspeed=windspeed,
+                           samplearea=samplearea,
+                           samplefrequency=samplefrequency,
+                           n_jobs=n_jobs)
+    if not IsRecords(inputdata, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(MVD, inputdata, binaxis, out=out,
+                            data_is_lwc=data_is_lwc,
+                            data_is_conc=data_is_conc,
+                            binsizes=binsizes,
+                            windspeed=windspeed,
+                            samplearea=samplearea,
+                            samplefrequency=samplefrequency,
+                            n_jobs=n_jobs)
+
     # if the data is a concentration it cannot be a lwc
     if data_is_conc:
         data_is_lwc = False
 
-    inputdata = inputdata.copy()
+    # no copy of inputdata needed, it is not changed in place
 
     if data_is_lwc:
         # data is as we expect it usually, and we can go on
@@ -34,6 +64,7 @@ def MVD(inputdata,
                     data_is_conc=data_is_conc,
                     binsizes=binsizes,
                     combined=False,
+                    n_jobs=n_jobs,
                     )
     else:
         # data_is_lwc and data_is_conc are set to false and we have to
@@ -43,6 +74,7 @@ def MVD(inputdata,
                             samplearea=samplearea,
                             samplefrequency=samplefrequency,
                             combined=False,
+                            n_jobs=n_jobs,
                             )
         # calculate liquid water concentration from concentration
         _lwc = LWC(_conc,
@@ -50,39 +82,29 @@ def MVD(inputdata,
                     samplefrequency=samplefrequency,
                     data_is_conc=data_is_conc,
                     binsizes=binsizes,
-                    combined=False)
-
-    _lwc = np.nan_to_num(_lwc)
-
-    if len(_lwc.shape) == 1:
-        _lwc = _lwc[np.newaxis, :]
-
-    # to be used as lookup table
-    binsizes = np.asarray(binsizes)
-
-    #adjust for when there is no lwc, and the first value is the index found
-    _lwc = np.ma.masked_array(_lwc, mask=(_lwc <= 0))
-
-    #divide the array by the respective sum to achieve a value in percent
-    pro = (_lwc.T / np.nansum(_lwc, axis=1)).T
-
-    #create an array with the time-wise sum of LWC
-    mvd = np.nancumsum(pro, axis=1)
+                    combined=False,
+                    n_jobs=n_jobs)
 
-    mvd_check = mvd.copy()
-    #change values so nanargmin works in finding the first one that is above 0.5
-    mvd_check[mvd_check < 0.5] = 1
+    # 1d input is handled as a single record
+    _lwc = np.atleast_2d(np.asarray(_lwc, dtype=float))
 
-    # gives us the indices where the first bin is above 1
-    mvd_check = np.nanargmin(mvd_check, axis=1)
+    if BinGeometry(binsizes).nbins != _lwc.shape[1]:
+        print('binsizes length must be one longer than length of bins')
+        return False
 
-    ix = np.arange(mvd.shape[0])
+    mvd = np.empty(_lwc.shape[0]) if out is None else out
 
-    # follows the formula in PADS Vers. 3.6.3
+    # the mvd is the 0.5 quantile of the lwc distribution, follows the
+    # formula in PADS Vers. 3.6.3
     # b_i + (b_i+1 - b_i) * (0.5 - cum_i-1) / pro_i
-    mvd = binsizes[mvd_check] + (binsizes[mvd_check+1] - binsizes[mvd_check]) * (0.5 - mvd[ix, mvd_check-1])/ pro[ix, mvd_check]
-    mvd[mvd.mask] = 0
-    mvd = mvd.data
+    # bins with no or negative lwc (and nan) are ignored, records
+    # without any lwc give 0
+    # with n_jobs the blocks of records are done in threads
+    ParallelRows(lambda rows: DiameterQuantiles(_lwc[rows], 0.5,
+                                                binsizes=binsizes,
+                                                weights='lwc',
+                                                out=mvd[rows]),
+                 _lwc.shape[0], n_jobs=n_jobs)
 
 
     # # #oldway to do calculation, way slower as loop goes over all records
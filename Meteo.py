@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Meteorological helper functions needed by FluxGrav, so it does not depend
+on any external package. All of them work on arrays of temperatures.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+# standard gravity in m s-2
+G0 = 9.80665
+
+# specific gas constant of dry air in J kg-1 K-1
+R_DRYAIR = 287.058
+
+# standard pressure in Pa
+P0 = 101325.
+
+_GRAVITYCACHE = {}
+
+
+def gravity(lat=None, asl=0, latisrad=False):
+    # gravity in m s-2, by the international gravity formula if a latitude
+    # is given, adjusted for the height above sea level (in m)
+    key = (lat, asl, latisrad)
+    if key not in _GRAVITYCACHE:
+        if lat is None:
+            g = G0
+        else:
+            phi = lat if latisrad else np.deg2rad(lat)
+            g = 9.780327 * (1 + 0.0053024 * np.sin(phi)**2 -
+                            0.0000058 * np.sin(2 * phi)**2)
+        _GRAVITYCACHE[key] = float(g - 3.086 * 10**-6 * asl)
+    return _GRAVITYCACHE[key]
+
+
+def airdensity(T, p=P0):
+    # density of (dry) air in kg m-3 for T in degree celsius and p in Pa
+    return p / (R_DRYAIR * (np.asarray(T, dtype=float) + 273.15))
+
+
+def waterdensity(T):
+    # density of water in kg m-3 for T in degree celsius (Thiesen formula)
+    T = np.asarray(T, dtype=float)
+    return 1000 * (1 - (T + 288.9414) / (508929.2 * (T + 68.12963)) *
+                   (T - 3.9863)**2)
+
+
+def viscosityair(T):
+    # dynamic viscosity of air in kg m-1 s-1 for T in degree celsius
+    # following Sutherland's law
+    T = np.asarray(T, dtype=float) + 273.15
+    return 1.458 * 10**-6 * T**1.5 / (T + 110.4)
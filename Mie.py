@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mie extinction efficiency of water droplets and a per bin lookup table.
+
+MieQext follows the algorithm of BHMIE (Bohren and Huffman 1983,
+Absorption and Scattering of Light by Small Particles), vectorised over
+the size parameter. As the extinction efficiency oscillates strongly with
+size, MieExtinctionTable averages it over each bin (weighted by the cross
+section) on a fine grid of sizes. The table only depends on the
+wavelength, refractive index and binsizes, so it is calculated once and
+stored on disk for later use.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+from BinGeometry import BinGeometry
+
+# refractive index of water in the visible, the absorption is negligible
+WATER_REFRACTIVEINDEX = 1.333 + 0j
+
+# where tables are stored on disk, None to only keep them in memory
+MIE_CACHEDIR = os.path.join(os.path.expanduser('~'), '.cache', 'cdp')
+
+_TABLECACHE = {}
+
+
+def MieQext(x, refractiveindex=WATER_REFRACTIVEINDEX):
+    # extinction efficiency for size parameters x = 2 pi r / wavelength
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    m = complex(refractiveindex)
+    y = m * x
+
+    nstop = np.floor(x + 4 * x**(1 / 3) + 2).astype(int)
+    nmax = int(max(nstop.max(), np.abs(y).max())) + 15
+
+    # logarithmic derivative D_n(mx) by downward recursion
+    d = np.zeros((nmax + 1, x.shape[0]), dtype=complex)
+    for n in range(nmax, 0, -1):
+        d[n - 1] = n / y - 1 / (d[n] + n / y)
+
+    psi0, psi1 = np.cos(x), np.sin(x)
+    chi0, chi1 = -np.sin(x), np.cos(x)
+    xi1 = psi1 - 1j * chi1
+
+    qext = np.zeros(x.shape[0])
+    # beyond their nstop the terms of small size parameters overflow, these
+    # are not used and the warnings are only noise
+    with np.errstate(over='ignore', invalid='ignore'):
+        for n in range(1, nstop.max() + 1):
+            psi = (2 * n - 1) / x * psi1 - psi0
+            chi = (2 * n - 1) / x * chi1 - chi0
+            xi = psi - 1j * chi
+
+            an = d[n] / m + n / x
+            an = (an * psi - psi1) / (an * xi - xi1)
+            bn = m * d[n] + n / x
+            bn = (bn * psi - psi1) / (bn * xi - xi1)
+
+            # only sum up to nstop of each size parameter
+            term = (2 * n + 1) * (an + bn).real
+            qext += np.where(n <= nstop, term, 0)
+
+            psi0, psi1 = psi1, psi
+            chi0, chi1 = chi1, chi
+            xi1 = psi1 - 1j * chi1
+
+    return 2 / x**2 * qext
+
+
+def _cachefile(cachedir, key):
+    name = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+    return os.path.join(cachedir, 'mie_' + name + '.npy')
+
+
+def MieExtinctionTable(binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14,
+                                 16, 18, 20, 22, 24, 26, 28, 30, 32, 34, 36,
+                                 38, 40, 42, 44, 46, 48, 50],
+                       wavelength=0.55,  # in micrometer
+                       refractiveindex=WATER_REFRACTIVEINDEX,
+                       npoints=100,
+                       cachedir=MIE_CACHEDIR,
+                       ):
+    # extinction efficiency per bin, defined so that pi * r_mid**2 * qext is
+    # the mean extinction cross section over the bin, i.e. it can be used
+    # as qext in SizeStatistics
+    geometry = BinGeometry(binsizes)
+    refractiveindex = complex(refractiveindex)
+    key = (tuple(geometry.binsizes.tolist()), float(wavelength),
+           refractiveindex.real, refractiveindex.imag, int(npoints))
+
+    if key in _TABLECACHE:
+        return _TABLECACHE[key]
+
+    filename = None if cachedir is None else _cachefile(cachedir, key)
+    if filename is not None and os.path.exists(filename):
+        table = np.load(filename)
+    else:
+        # fine grid of diameters within each bin (midpoints of subintervals)
+        steps = (np.arange(npoints) + 0.5) / npoints
+        diameters = (geometry.binsizes[:-1, np.newaxis] +
+                     geometry.widths[:, np.newaxis] * steps[np.newaxis, :])
+        radii = diameters / 2
+        qext = MieQext(2 * np.pi * radii.ravel() / wavelength,
+                       refractiveindex).reshape(radii.shape)
+
+        # mean cross section over the bin relative to the one at the midpoint
+        table = (qext * radii**2).mean(axis=1) / geometry.r2
+
+        if filename is not None:
+            try:
+                os.makedirs(cachedir, exist_ok=True)
+                np.save(filename, table)
+            except OSError:
+                # not being able to store the table only costs time
+                pass
+
+    table.flags.writeable = False
+    _TABLECACHE[key] = table
+    return table
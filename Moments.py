@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Moments of the size distribution and the quantities derived from them.
+
+The k-th moment of a record is sum_i n_i * r_i**k with n_i the counts (or
+concentration) and r_i the radius at the midpoint of bin i. Any set of
+moments is calculated with one multiplication of the bins with a (cached)
+bins x moments matrix of the powers of the midpoints, so all statistics
+come from a single read of the bins.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+from BinGeometry import BinGeometry
+
+# matrices of powers, keyed by geometry, powers and radius/diameter
+_POWERCACHE = {}
+
+
+def PowerMatrix(binsizes, moments=[0, 1, 2, 3], radius=True):
+    # bins x moments matrix with the powers of the midpoints (micrometer)
+    # radius=False takes the powers of the diameter instead of the radius
+    geometry = BinGeometry(binsizes)
+    moments = tuple(float(_) for _ in np.atleast_1d(moments))
+    key = (id(geometry), moments, radius)
+    if key not in _POWERCACHE:
+        sizes = geometry.radii if radius else geometry.midpoints
+        matrix = sizes[:, np.newaxis] ** np.asarray(moments)[np.newaxis, :]
+        matrix.flags.writeable = False
+        _POWERCACHE[key] = matrix
+    return _POWERCACHE[key]
+
+
+def WeightedSum(bins, matrix):
+    # bins @ matrix, but ignoring nan in the bins like np.nansum does
+    bins = np.asarray(bins)
+    if bins.dtype.kind == 'f' and np.isnan(bins).any():
+        return np.where(np.isnan(bins), 0, bins) @ matrix
+    return bins @ matrix
+
+
+def Moments(bins,
+            moments=[0, 1, 2, 3],
+            binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16, 18, 20,
+                      22, 24, 26, 28, 30, 32, 34, 36, 38, 40, 42, 44, 46, 48,
+                      50],
+            radius=True,
+            ):
+    # returns records x moments with sum_i n_i * r_i**k for each k in moments
+    # (or only records if moments is a single number)
+    # radius=False uses the diameter instead of the radius
+    matrix = PowerMatrix(binsizes, moments, radius=radius)
+    bins = np.asarray(bins)
+
+    if bins.shape[-1] != matrix.shape[0]:
+        print('binsizes length must be one longer than length of bins')
+        return False
+
+    result = WeightedSum(bins, matrix)
+    return result[..., 0] if np.ndim(moments) == 0 else result
+
+
+def SizeStatistics(bins,
+                   binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16,
+                             18, 20, 22, 24, 26, 28, 30, 32, 34, 36, 38, 40,
+                             42, 44, 46, 48, 50],
+                   qext=2,
+                   ):
+    # statistics of the size distribution from the moments 0 to 3, all
+    # calculated with a single matrix multiplication
+    # bins should be the concentration per bin in # / cm^3 for the
+    # surface and extinction to have the units given below
+    #   number        total number (M0)                       # / cm^3
+    #   meandiameter  number mean diameter (2 M1 / M0)        micrometer
+    #   ed            effective diameter (2 M3 / M2), as ED   micrometer
+    #   surface       surface area (4 pi M2)                  um^2 / cm^3
+    #   extinction    extinction coefficient                  1 / km
+    #                 (pi sum_i n_i qext_i r_i**2)
+    # qext is the extinction efficiency, either a number or one per bin,
+    # 2 is the limit for droplets much larger than the wavelength
+    geometry = BinGeometry(binsizes)
+    powers = PowerMatrix(geometry, [0, 1, 2, 3])
+    qext = np.broadcast_to(np.asarray(qext, dtype=float), (geometry.nbins,))
+
+    # the extinction is one more column of the same matrix
+    matrix = np.column_stack([powers, np.pi * qext * geometry.r2])
+
+    bins = np.asarray(bins)
+    if bins.shape[-1] != geometry.nbins:
+        print('binsizes length must be one longer than length of bins')
+        return False
+
+    moments = WeightedSum(bins, matrix)
+    m0, m1, m2, m3 = (moments[..., _] for _ in range(4))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        meandiameter = np.where(m0 > 0, 2 * m1 / m0, 0)
+        ed = np.where(m2 > 0, 2 * m3 / m2, 0)
+
+    return {'number': m0,
+            'meandiameter': meandiameter,
+            'ed': ed,
+            'surface': 4 * np.pi * m2,
+            # um^2 / cm^3 = 10**-12 m^2 / 10**-6 m^3 = 10**-3 / km
+            'extinction': moments[..., 4] * 10**-3,
+            }
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Online processing of single records as they arrive, e.g. for a live display
+of the 10 Hz data of CDPAcquisition.
+
+OnlineProcessor keeps the last records (bin counts and sample volumes) in a
+preallocated ring buffer and for every window (1 s, 1 min and 30 min by
+default) the running totals of the counts and volumes within the window.
+An update adds the new record to the totals and removes the one that fell
+out of each window, so it costs O(bins) per window and does not allocate
+any arrays. The statistics of a window are those of the summed spectrum,
+i.e. the concentration is total counts / total sampled volume.
+
+    processor = OnlineProcessor(windspeed=5)
+    while True:
+        record = await acquisition.queue.get()
+        result = processor.addpacket(record['packet'])
+        # result[0] is the record, result[1:] the windows, the columns
+        # are ONLINE_COLUMNS; result is overwritten by the next update
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+from BinGeometry import BinGeometry
+from DecodeRaw import PACKET_LENGTH
+
+# rolling windows in seconds
+ONLINE_WINDOWS = (1, 60, 1800)
+
+# the columns of the result of an update
+ONLINE_COLUMNS = ['conc_total', 'lwc_total', 'mvd', 'ed']
+
+
+class OnlineProcessor:
+    def __init__(self,
+                 binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16,
+                           18, 20, 22, 24, 26, 28, 30, 32, 34, 36, 38, 40,
+                           42, 44, 46, 48, 50],
+                 windspeed=1,  # in m/s
+                 samplearea=0.298,  # as area in square millimeters
+                 samplefrequency=10,  # as Hz
+                 windows=ONLINE_WINDOWS,  # in s
+                 ):
+        geometry = BinGeometry(binsizes)
+        self.geometry = geometry
+        self.windspeed = windspeed
+        self.samplearea = samplearea
+        self.samplefrequency = samplefrequency
+        self.windows = tuple(windows)
+
+        # everything that does not change between updates is done once
+        nbins = geometry.nbins
+        self._binsizes = geometry.binsizes
+        self._widths = geometry.widths
+        # conc in # / cm^3 times this gives the lwc in g / m^3
+        self._lwcfactor = geometry.dropvolume * 10**6
+        self._r2 = geometry.r2
+        self._r3 = geometry.r3
+
+        # number of records per window and the ring buffer for the longest
+        self._nwindow = np.array([max(1, int(round(_ * samplefrequency)))
+                                  for _ in self.windows])
+        self.size = int(self._nwindow.max())
+        self._counts = np.zeros((self.size, nbins))
+        self._volumes = np.zeros(self.size)
+        self._sumcounts = np.zeros((len(self.windows), nbins))
+        self._sumvolumes = np.zeros(len(self.windows))
+
+        # scratch arrays for the statistics of one spectrum
+        self._bins = np.zeros(nbins)
+        self._uint = np.zeros(nbins, dtype=np.uint32)
+        self._conc = np.zeros(nbins)
+        self._lwc = np.zeros(nbins)
+        self._cum = np.zeros(nbins)
+
+        self.result = np.zeros((1 + len(self.windows), len(ONLINE_COLUMNS)))
+        self.nrecords = 0
+        self.position = 0
+
+    def volume(self, windspeed=None):
+        # sample volume of one record in cm^3 as in SampleVolume
+        if windspeed is None:
+            windspeed = self.windspeed
+        volume = (windspeed * (100 / self.samplefrequency) *
+                  self.samplearea / 10**2)
+        # like ConcPerCCM, records with no (valid) volume give nothing
+        return volume if volume > 0 else 0.0
+
+    def _statistics(self, counts, volume, out):
+        # conc_total, lwc_total, mvd and ed of a spectrum of counts sampled
+        # in volume (cm^3), as ConcPerCCM, LWC, MVD and ED would give them
+        if not volume > 0:
+            out[:] = 0
+            return out
+
+        conc = np.divide(counts, volume, out=self._conc)
+        lwc = np.multiply(conc, self._lwcfactor, out=self._lwc)
+        cum = np.cumsum(lwc, out=self._cum)
+        lwctotal = cum[-1]
+
+        out[0] = conc.sum()
+        out[1] = lwctotal
+
+        if lwctotal > 0:
+            # the bin where half of the lwc is reached, as DiameterQuantiles
+            ix = min(int(np.searchsorted(cum, 0.5 * lwctotal)),
+                     cum.shape[0] - 1)
+            before = cum[ix - 1] if ix > 0 else 0.0
+            out[2] = (self._binsizes[ix] + self._widths[ix] *
+                      (0.5 * lwctotal - before) / lwc[ix])
+        else:
+            out[2] = 0
+
+        r2 = np.dot(counts, self._r2)
+        out[3] = 2 * np.dot(counts, self._r3) / r2 if r2 > 0 else 0
+        return out
+
+    def update(self, bins, windspeed=None):
+        # add one record of bin counts, returns self.result with the record
+        # in the first row and the windows in the following rows
+        np.copyto(self._bins, bins)
+        volume = self.volume(windspeed)
+        if volume == 0:
+            # no sample volume, the counts cannot be related to anything
+            self._bins[:] = 0
+
+        position = self.position
+        for ix, nwindow in enumerate(self._nwindow):
+            self._sumcounts[ix] += self._bins
+            self._sumvolumes[ix] += volume
+            if self.nrecords >= nwindow:
+                # the record that leaves the window
+                old = (position - nwindow) % self.size
+                self._sumcounts[ix] -= self._counts[old]
+                self._sumvolumes[ix] -= self._volumes[old]
+
+        self._counts[position] = self._bins
+        self._volumes[position] = volume
+        self.nrecords += 1
+        self.position = (position + 1) % self.size
+
+        if self.position == 0:
+            # the counts are integers and summed exactly, the volumes are
+            # summed up again once per round to not accumulate rounding
+            for ix, nwindow in enumerate(self._nwindow):
+                self._sumvolumes[ix] = self._volumes[self.size - nwindow:].sum()
+
+        self._statistics(self._bins, volume, self.result[0])
+        for ix in range(len(self.windows)):
+            self._statistics(self._sumcounts[ix], self._sumvolumes[ix],
+                             self.result[ix + 1])
+        return self.result
+
+    def addpacket(self, packet, windspeed=None):
+        # add one raw 156 byte response of the cdp (see DecodeRaw for the
+        # layout, the high word of the bins is taken MSB first)
+        if len(packet) != PACKET_LENGTH:
+            raise ValueError('A cdp response has ' + str(PACKET_LENGTH) +
+                             ' bytes, got ' + str(len(packet)))
+        high = np.frombuffer(packet, dtype='>u2', count=60, offset=34)
+        low = np.frombuffer(packet, dtype='<u2', count=60, offset=34)
+        np.left_shift(high[0::2], 16, out=self._uint, dtype=np.uint32)
+        np.bitwise_or(self._uint, low[1::2], out=self._uint)
+        return self.update(self._uint, windspeed=windspeed)
+
+    def reset(self):
+        # forget all records, e.g. after a gap in the data
+        self._counts[:] = 0
+        self._volumes[:] = 0
+        self._sumcounts[:] = 0
+        self._sumvolumes[:] = 0
+        self.result[:] = 0
+        self.nrecords = 0
+        self.position = 0
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thread parallel execution of the numpy kernels over blocks of records.
+
+NumPy releases the GIL in its elementwise operations and reductions, so
+ConcPerCCM, LWC and MVD can split the records (time axis) into contiguous
+row blocks that are worked on by a shared thread pool. Every block writes
+into its own rows of a preallocated output, so the result is the same as
+with n_jobs=1 and nothing has to be copied between processes.
+
+    conc = ConcPerCCM(bincounts, combined=False, n_jobs=4)
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import os
+
+# blocks smaller than this are not worth the overhead of a thread
+MINROWS = 2**12
+
+_EXECUTORS = {}
+
+
+def Workers(n_jobs=1):
+    # number of threads for n_jobs, None or -1 uses all cores
+    if n_jobs is None or n_jobs < 0:
+        return os.cpu_count() or 1
+    return max(1, int(n_jobs))
+
+
+def Executor(n_jobs=None):
+    # the thread pool shared by all functions for this number of workers
+    nworkers = Workers(n_jobs)
+    if nworkers not in _EXECUTORS:
+        from concurrent.futures import ThreadPoolExecutor
+        _EXECUTORS[nworkers] = ThreadPoolExecutor(max_workers=nworkers)
+    return _EXECUTORS[nworkers]
+
+
+def RowBlocks(nrows, n_jobs=1, minrows=MINROWS):
+    # split nrows into (at most) one contiguous slice per worker
+    nblocks = max(1, min(Workers(n_jobs), nrows // max(1, minrows)))
+    bounds = [nrows * _ // nblocks for _ in range(nblocks + 1)]
+    return [slice(start, stop) for start, stop in zip(bounds[:-1],
+                                                      bounds[1:])]
+
+
+def SliceRows(array, rows):
+    # the rows of an array, arrays with a single row are broadcast
+    # (e.g. one windspeed for all records)
+    return array if array.shape[0] == 1 else array[rows]
+
+
+def ParallelRows(kernel, nrows, n_jobs=1, minrows=MINROWS):
+    # call kernel(rows) for the row blocks, on the shared thread pool if
+    # there is more than one block, exceptions are raised in the caller
+    blocks = RowBlocks(nrows, n_jobs=n_jobs, minrows=minrows)
+    if len(blocks) == 1:
+        kernel(blocks[0])
+    else:
+        list(Executor(n_jobs).map(kernel, blocks))
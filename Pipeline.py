@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chunked processing of whole campaigns with bounded memory.
+
+The daily TableFiles are memory mapped and processed in chunks of a fixed
+number of records: (decoding of raw records ->) rebinning -> concentration
+-> LWC -> MVD/ED/FluxGrav. Only the results per record are kept for each
+chunk, so the memory needed does not depend on how long the campaign is.
+
+    for result in StreamCampaign(CampaignFiles('/data/cdp'), windspeed=5):
+        ...
+
+or to write everything into one csv file
+
+    WriteStream(StreamCampaign(files, rebin='Gonser2011'), 'campaign.csv')
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import functools
+import glob
+import hashlib
+import os
+import types
+
+import numpy as np
+
+from BinGeometry import CDP2_BINSIZES
+from ComputeAll import ComputeAll
+from ReadTOB1 import ReadTOB1Chunks, TOB1Bins
+
+# records per chunk, at 10 Hz this is a bit less than 2 hours
+CHUNKSIZE = 2**16
+
+# the campbell loggers count the seconds since 1990-01-01 00:00:00
+LOGGER_EPOCH = np.datetime64('1990-01-01T00:00:00')
+
+# results per record in the order they are written by WriteStream
+RESULT_NAMES = ['time', 'conc_total', 'lwc_total', 'mvd', 'ed', 'fluxgrav']
+
+
+def CampaignFiles(directory, pattern='*cdp_data*.dat'):
+    # the daily files of a campaign directory in time order, the logger
+    # names the files with increasing numbers/dates so sorting is enough
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+
+def Rebinning(rebin=None):
+    # gives the rebinning matrix (or None) and the resulting binsizes for
+    #   None                        no rebinning, default CDP bins
+    #   'Gonser2011'/'Spiegel2012'  the table of the papers
+    #   (matrix, binsizes)          any other rebinning
+    if rebin is None:
+        return None, CDP2_BINSIZES
+    if isinstance(rebin, str):
+        from Rebin import TableMatrix, REBIN_TABLE, REBIN_BINSIZES
+        if rebin not in ['Gonser2011', 'Spiegel2012']:
+            raise ValueError('Unknown rebinning ' + rebin)
+        return TableMatrix(REBIN_TABLE), REBIN_BINSIZES
+    return rebin
+
+
+def SettingsToken(value):
+    # stable representation of a setting to compare or hash them (stored
+    # results of Batch, keys of Cache), arrays by a hash of their content
+    # (their repr is shortened with ...), objects by their type and state
+    from QualityControl import QualityControl
+    if isinstance(value, np.ndarray):
+        return ('array', value.dtype.str, value.shape,
+                hashlib.sha1(np.ascontiguousarray(value).tobytes()
+                             ).hexdigest())
+    if isinstance(value, (list, tuple)):
+        return ((type(value).__name__,) +
+                tuple(SettingsToken(_) for _ in value))
+    if isinstance(value, dict):
+        return tuple(sorted((key, SettingsToken(_))
+                            for key, _ in value.items()))
+    if isinstance(value, QualityControl):
+        # only the rules matter, not the counts
+        return ('QualityControl', SettingsToken(value.rules))
+    if callable(getattr(value, 'settings', None)):
+        # e.g. WindJoin, what it was made from and not its state of the run
+        return (type(value).__module__ + '.' + type(value).__qualname__,
+                SettingsToken(value.settings()))
+    if isinstance(value, functools.partial):
+        return ('partial', SettingsToken(value.func),
+                SettingsToken(value.args), SettingsToken(value.keywords))
+    if isinstance(value, (types.FunctionType, types.BuiltinFunctionType,
+                          type)):
+        return value.__module__ + '.' + value.__qualname__
+    if hasattr(value, '__dict__'):
+        return (type(value).__module__ + '.' + type(value).__qualname__,
+                SettingsToken(vars(value)))
+    return repr(value)
+
+
+def ChunkTime(chunk):
+    # time of the records in seconds since the logger epoch (1990-01-01)
+    names = chunk.dtype.names
+    if names is None or 'SECONDS' not in names:
+        return np.full(chunk.shape[0], np.nan)
+    time = chunk['SECONDS'].astype(np.float64)
+    if 'NANOSECONDS' in names:
+        time += chunk['NANOSECONDS'] * 10**-9
+    return time
+
+
+def _qualitycontrol(qc):
+    # qc can be a QualityControl, a list of rules or True for QC_RULES
+    from QualityControl import QualityControl, QC_RULES
+    if isinstance(qc, QualityControl):
+        return qc
+    return QualityControl(QC_RULES if qc is True else qc)
+
+
+def ChunkBins(chunk, checksum_must_match=False, qc=None):
+    # bin counts of a chunk of the cdp_data or the cdp_data_raw table, as
+    # well as the mask of the records that are kept
+    # checksum_must_match drops the records with a wrong checksum and qc
+    # (see QualityControl) the rejected records before anything is
+    # calculated on them
+    if 'dummy' in chunk.dtype.names:
+        from DecodeRaw import DecodeRaw
+        from Checksum import ChecksumMask
+        keep = (ChecksumMask(chunk) if checksum_must_match
+                else np.ones(chunk.shape[0], dtype=bool))
+        # the housekeeping is only converted if it is checked
+        decoded = DecodeRaw(chunk[keep] if not keep.all() else chunk,
+                            convert=qc is not None)
+        bins = decoded['cdp_data_bincount']
+        if qc is not None:
+            accepted = _qualitycontrol(qc)(decoded)
+            if not accepted.all():
+                bins = bins[accepted]
+                keep[keep] = accepted
+        return bins, keep
+
+    # the cdp_data table has the checksum of the cdp and the one calculated
+    # on the logger for each record
+    bins = TOB1Bins(chunk)
+    if checksum_must_match:
+        from Checksum import ChecksumMask
+        keep = ChecksumMask(chunk)
+    else:
+        keep = np.ones(chunk.shape[0], dtype=bool)
+
+    if qc is not None:
+        # only the records with a valid checksum are counted by the qc
+        accepted = _qualitycontrol(qc)(chunk if keep.all() else chunk[keep])
+        keep[keep] = accepted
+    return (bins if keep.all() else bins[keep]), keep
+
+
+def _perrecord(values, chunk, keep):
+    # values (windspeed, temperature) can be a number/list, the name of a
+    # field of the table or a function that gives them for a chunk
+    if callable(values):
+        values = np.asarray(values(chunk), dtype=float)
+    elif isinstance(values, str):
+        values = np.asarray(chunk[values], dtype=float)
+    else:
+        return values
+    return values if keep.all() else values[keep]
+
+
+def FileValues(values, filename, chunksize=CHUNKSIZE):
+    # per record values (windspeed, temperature) for all records of a file,
+    # fields and functions are evaluated chunk by chunk as in ProcessChunk
+    if not (callable(values) or isinstance(values, str)):
+        return values
+    parts = []
+    for chunk in ReadTOB1Chunks(filename, chunksize=chunksize):
+        keep = np.ones(chunk.shape[0], dtype=bool)
+        parts.append(np.broadcast_to(_perrecord(values, chunk, keep),
+                                     (chunk.shape[0],)))
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+
+def ProcessChunk(chunk,
+                 windspeed=[1],  # in m/s
+                 samplearea=0.298,  # as area in square millimeters
+                 samplefrequency=10,  # as Hz
+                 rebin=None,
+                 checksum_must_match=False,
+                 T=[20],  # in degree celsius
+                 lat=None,
+                 asl=0,
+                 qc=None,
+                 sparse=False,
+                 buffer=None,
+                 ):
+    # process one chunk of records of a TOB1 table, returns a dict with
+    # time, conc_total, lwc_total, mvd, ed and fluxgrav per record
+    # buffer can be a chunksize x bins array that is reused for the bins
+    # sparse=True only calculates the records with counts (see Sparse)
+    matrix, binsizes = Rebinning(rebin)
+    bins, keep = ChunkBins(chunk, checksum_must_match=checksum_must_match,
+                           qc=qc)
+    if sparse:
+        from Sparse import SparseBins
+        bins = SparseBins(bins)
+
+    if matrix is not None:
+        from Rebin import Rebin
+        bins = Rebin(bins, matrix)
+
+    out = None
+    if (buffer is not None and not sparse and
+            buffer.shape[0] >= bins.shape[0]):
+        out = {'conc': buffer[:bins.shape[0]]}
+
+    result = ComputeAll(bins,
+                        windspeed=_perrecord(windspeed, chunk, keep),
+                        samplearea=samplearea,
+                        samplefrequency=samplefrequency,
+                        binsizes=binsizes,
+                        perbin=False,
+                        out=out,
+                        T=_perrecord(T, chunk, keep),
+                        lat=lat,
+                        asl=asl,
+                        )
+    result['time'] = ChunkTime(chunk)[keep]
+    if 'fluxgrav' not in result:
+        # without T there is no gravitational flux
+        result['fluxgrav'] = np.full(result['time'].shape[0], np.nan)
+    return {name: result[name] for name in RESULT_NAMES}
+
+
+def StreamCampaign(filenames,
+                   chunksize=CHUNKSIZE,
+                   windspeed=[1],  # in m/s
+                   samplearea=0.298,  # as area in square millimeters
+                   samplefrequency=10,  # as Hz
+                   rebin=None,
+                   checksum_must_match=False,
+                   T=[20],  # in degree celsius
+                   lat=None,
+                   asl=0,
+                   qc=None,
+                   sparse=False,
+                   ):
+    # generator over all chunks of all files, yields the result of
+    # ProcessChunk for each chunk in the order of the files
+    _, binsizes = Rebinning(rebin)
+    if qc is not None:
+        # one QualityControl for all chunks so the counts add up
+        qc = _qualitycontrol(qc)
+    buffer = np.empty((chunksize, len(binsizes) - 1))
+
+    if isinstance(filenames, str):
+        filenames = [filenames]
+
+    for filename in filenames:
+        for chunk in ReadTOB1Chunks(filename, chunksize=chunksize):
+            yield ProcessChunk(chunk,
+                               windspeed=windspeed,
+                               samplearea=samplearea,
+                               samplefrequency=samplefrequency,
+                               rebin=rebin,
+                               checksum_must_match=checksum_must_match,
+                               T=T,
+                               lat=lat,
+                               asl=asl,
+                               qc=qc,
+                               sparse=sparse,
+                               buffer=buffer,
+                               )
+
+
+def WriteStream(results, filename, delimiter=','):
+    # write the results of StreamCampaign chunk by chunk into a csv file,
+    # returns the number of records written
+    nrecords = 0
+    with open(filename, 'w') as fo:
+        fo.write(delimiter.join(RESULT_NAMES) + '\n')
+        for result in results:
+            np.savetxt(fo,
+                       np.column_stack([result[_] for _ in RESULT_NAMES]),
+                       delimiter=delimiter,
+                       fmt='%.10g')
+            nrecords += result['time'].shape[0]
+    return nrecords
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rule based quality control of the records by their housekeeping values,
+so bad records can be dropped before they are processed.
+
+The rules are plain dicts, each looks at one field of the records (the
+cdp_data table from ReadTOB1 or the dict of DecodeRaw):
+    {'name': 'laser_current', 'field': 'Current_Laser_mA',
+     'min': 20, 'max': 200}                   inside the limits
+    {'name': 'checksum', 'field': 'cdp_data_cdp_chksum',
+     'equal': 'cdp_data_calc_chksum'}          same as a field (or value)
+    {'name': 'resync', 'field': 'cdp_flushed_scans',
+     'unchanged': True}                        counter did not change
+                                               since the record before
+nan never passes a limit. Every rule is evaluated once on its column and
+and-ed into one mask, the rejections are counted per rule (a record can
+be rejected by several rules).
+
+    qc = QualityControl()
+    for result in StreamCampaign(files, qc=qc):
+        ...
+    print(qc.counts)
+
+The limits of QC_RULES are wide plausibility limits, adjust them to your
+instrument.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+QC_RULES = [
+    {'name': 'laser_current', 'field': 'Current_Laser_mA',
+     'min': 20, 'max': 200},
+    {'name': 'laser_temperature', 'field': 'Laser_T',
+     'min': -20, 'max': 60},
+    {'name': 'wingboard_temperature', 'field': 'Wingboard_T',
+     'min': -40, 'max': 60},
+    {'name': 'control_board_temperature', 'field': 'Control_Board_T',
+     'min': -40, 'max': 70},
+    {'name': 'sizer_baseline', 'field': 'Sizer_Baseline',
+     'min': 0, 'max': 1},
+    {'name': 'qualifier_baseline', 'field': 'Qualifier_Baseline',
+     'min': 0, 'max': 1},
+    {'name': 'monitor_5v', 'field': 'Monitor_5V',
+     'min': 4.5, 'max': 5.5},
+    {'name': 'checksum', 'field': 'cdp_data_cdp_chksum',
+     'equal': 'cdp_data_calc_chksum'},
+]
+
+_RULE_KEYS = ['name', 'field', 'min', 'max', 'equal', 'unchanged']
+
+
+def _names(data):
+    if isinstance(data, dict):
+        return set(data.keys())
+    return set(data.dtype.names or [])
+
+
+def RuleMask(data, rule, previous=None):
+    # boolean mask of the records that pass one rule, previous is the last
+    # value of the field before data (for unchanged)
+    unknown = set(rule) - set(_RULE_KEYS)
+    if unknown:
+        raise ValueError('Unknown keys ' + ', '.join(sorted(unknown)) +
+                         ' in rule ' + str(rule.get('name')))
+
+    values = np.asarray(data[rule['field']])
+    if values.ndim > 1:
+        raise ValueError('Rules work on single fields, ' + rule['field'] +
+                         ' has ' + str(values.shape[1]) + ' columns')
+
+    mask = np.ones(values.shape[0], dtype=bool)
+    if 'min' in rule:
+        mask &= values >= rule['min']
+    if 'max' in rule:
+        mask &= values <= rule['max']
+    if 'equal' in rule:
+        other = rule['equal']
+        if isinstance(other, str):
+            other = data[other]
+        mask &= values == other
+    if rule.get('unchanged'):
+        changed = np.empty(values.shape[0], dtype=bool)
+        changed[1:] = values[1:] != values[:-1]
+        changed[:1] = (previous is not None and
+                       values.shape[0] > 0 and values[0] != previous)
+        mask &= ~changed
+    return mask
+
+
+class QualityControl:
+    # applies a list of rules to records and keeps the rejection counts
+    # over all calls (e.g. over the chunks of a campaign)
+    def __init__(self, rules=QC_RULES):
+        self.rules = [dict(_) for _ in rules]
+        for ix, rule in enumerate(self.rules):
+            rule.setdefault('name', rule['field'] + '_' + str(ix))
+        self.reset()
+
+    def __repr__(self):
+        return 'QualityControl(' + repr(self.rules) + ')'
+
+    def reset(self):
+        self.counts = {rule['name']: 0 for rule in self.rules}
+        self.nrecords = 0
+        self.rejected = 0
+        # rules that were left out as the data did not have their fields
+        self.skipped = set()
+        self._previous = {}
+
+    def __call__(self, data):
+        # mask of the accepted records
+        names = _names(data)
+        nrecords = len(data[next(iter(names))]) if names else 0
+        mask = np.ones(nrecords, dtype=bool)
+
+        for rule in self.rules:
+            fields = [rule['field']]
+            if isinstance(rule.get('equal'), str):
+                fields.append(rule['equal'])
+            if not all(_ in names for _ in fields):
+                self.skipped.add(rule['name'])
+                continue
+
+            passed = RuleMask(data, rule,
+                              previous=self._previous.get(rule['name']))
+            if rule.get('unchanged') and nrecords:
+                self._previous[rule['name']] = data[rule['field']][-1]
+
+            self.counts[rule['name']] += int(nrecords -
+                                             np.count_nonzero(passed))
+            mask &= passed
+
+        self.nrecords += nrecords
+        self.rejected += int(nrecords - np.count_nonzero(mask))
+        return mask
+
+    def report(self):
+        # text with the rejections per rule
+        lines = ['QC: ' + str(self.rejected) + ' of ' + str(self.nrecords) +
+                 ' records rejected']
+        for name, count in self.counts.items():
+            lines.append('  ' + name + ': ' + str(count) +
+                         (' (skipped, no field)' if name in self.skipped
+                          else ''))
+        return '\n'.join(lines)
+
+
+def QCMask(data, rules=QC_RULES, returncounts=False):
+    # mask of the records passing all rules, with returncounts=True also
+    # the number of records rejected by each rule
+    qc = QualityControl(rules)
+    mask = qc(data)
+    if returncounts:
+        return mask, qc.counts
+    return mask
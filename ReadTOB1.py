@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reader for the binary TOB1 files written by TableFile(..., 64, ...) in
+CDP_Communications.cr3 (cdp_data, cdp_data_30min, cdp_data_raw and
+status_data).
+
+The ASCII header (5 lines) is translated into a numpy structured dtype and
+the records are mapped with np.memmap, so no data is copied until it is
+actually used. Array variables like cdp_data_bincount(1..30) are grouped
+into one subarray field, i.e. data['cdp_data_bincount'] is directly the
+timeseries x 30 bins array that ConcPerCCM and Gonser2011 expect.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import csv
+import re
+
+import numpy as np
+
+# byte order as given by Campbell Scientific for TOB1 files,
+# the integer types of the logger (UINT2/UINT4/FP2) are MSB first
+# while the IEEE4 and the timestamp/record number are LSB first
+TOB1_TYPES = {
+    'IEEE4': '<f4',
+    'IEEE4L': '<f4',
+    'IEEE4B': '>f4',
+    'IEEE8': '<f8',
+    'IEEE8L': '<f8',
+    'IEEE8B': '>f8',
+    'ULONG': '<u4',
+    'LONG': '<i4',
+    'UINT4': '>u4',
+    'INT4': '>i4',
+    'UINT2': '>u2',
+    'INT2': '>i2',
+    'FP2': '>u2',
+    'BOOL': 'u1',
+    'BOOL2': '>u2',
+    'BOOL4': '>u4',
+}
+
+# number of ascii lines before the binary data starts
+TOB1_HEADERLINES = 5
+
+
+def TOB1Header(filename):
+    # read the five header lines of a TOB1 file and return them as dict
+    # together with the byte offset where the binary records start
+    with open(filename, 'rb') as fo:
+        lines = [fo.readline() for _ in range(TOB1_HEADERLINES)]
+        offset = fo.tell()
+
+    lines = [next(csv.reader([line.decode('ascii', 'replace').strip()]))
+             for line in lines]
+
+    if not lines[0] or lines[0][0] != 'TOB1':
+        raise ValueError(str(filename) + ' is not a TOB1 file')
+
+    header = {'environment': lines[0],
+              'names': lines[1],
+              'units': lines[2],
+              'processing': lines[3],
+              'types': lines[4],
+              'offset': offset,
+              }
+    return header
+
+
+def TOB1Dtype(names, types, grouparrays=True):
+    # map the TOB1 field names/types to a numpy structured dtype
+    fields = []
+    for name, _type in zip(names, types):
+        if _type.startswith('ASCII'):
+            # ascii fields are given as ASCII(len)
+            fields.append([name, 'S' + _type[6:-1], 1, None])
+            continue
+        if _type not in TOB1_TYPES:
+            raise ValueError('Unknown TOB1 data type ' + _type +
+                             ' for field ' + name)
+        fields.append([name, TOB1_TYPES[_type], 1, None])
+
+    if grouparrays:
+        # array elements are written as name(1), name(2), ... by the logger
+        # consecutive elements of the same type become one subarray field
+        grouped = []
+        for field in fields:
+            match = re.fullmatch(r'(.+)\((\d+)\)', field[0])
+            if match is None:
+                grouped.append(field)
+                continue
+            base, index = match.group(1), int(match.group(2))
+            last = grouped[-1] if grouped else None
+            if (last is not None and last[3] == base and
+                    last[1] == field[1] and last[2] + 1 == index):
+                last[2] += 1
+            else:
+                grouped.append([field[0], field[1], 1, None]
+                               if index != 1 else
+                               [base, field[1], 1, base])
+        fields = grouped
+
+    return np.dtype([(name, _type) if size == 1 or base is None
+                     else (name, _type, (size,))
+                     for name, _type, size, base in fields])
+
+
+def FP2ToFloat(fp2):
+    # decode the 2 byte final storage format of campbell loggers
+    # bit 15 is the sign, bit 14-13 the negative decimal exponent and
+    # bit 12-0 the mantissa
+    fp2 = np.asarray(fp2, dtype=np.uint16)
+    sign = np.where(fp2 & 0x8000, -1.0, 1.0)
+    exponent = (fp2 >> 13) & 0x3
+    mantissa = (fp2 & 0x1FFF).astype(np.float64)
+
+    values = sign * mantissa / 10.0**exponent
+    # special values as given by the logger manual
+    values[(mantissa == 8191) & (exponent == 0)] *= np.inf
+    values[(mantissa == 8190) & (exponent == 0)] = np.nan
+    return values
+
+
+def ReadTOB1(filename,
+             memmap=True,
+             grouparrays=True,
+             getbins=False,
+             binfield='cdp_data_bincount',
+             ):
+    # read a TOB1 file into a structured array,
+    # memmap=True maps the file without reading it (zero copy)
+    # memmap=False reads the file once and views the buffer without copying
+    # getbins=True returns only the timeseries x bins array of binfield
+    header = TOB1Header(filename)
+    dtype = TOB1Dtype(header['names'], header['types'],
+                      grouparrays=grouparrays)
+
+    if memmap:
+        import os
+        nrecords = (os.path.getsize(filename) - header['offset'])
+        nrecords //= dtype.itemsize
+        if nrecords == 0:
+            data = np.zeros(0, dtype=dtype)
+        else:
+            data = np.memmap(filename, dtype=dtype, mode='r',
+                             offset=header['offset'], shape=(nrecords,))
+    else:
+        with open(filename, 'rb') as fo:
+            fo.seek(header['offset'])
+            buffer = fo.read()
+        # drop a possibly incomplete last record (e.g. logger reset)
+        nrecords = len(buffer) // dtype.itemsize
+        data = np.frombuffer(buffer, dtype=dtype, count=nrecords)
+
+    if getbins:
+        return TOB1Bins(data, binfield=binfield)
+
+    return data, header
+
+
+def TOB1Bins(data, binfield='cdp_data_bincount'):
+    # return the timeseries x bins view of a record array read by ReadTOB1
+    if binfield in data.dtype.names:
+        return data[binfield]
+
+    # fields were not grouped, build a strided view over the single fields
+    names = [binfield + '(' + str(_ + 1) + ')' for _ in range(30)]
+    if names[0] not in data.dtype.names:
+        raise KeyError('No bin field ' + binfield + ' in data')
+    first = data.dtype.fields[names[0]]
+    nbins = 0
+    for name in names:
+        if name not in data.dtype.fields:
+            break
+        if (data.dtype.fields[name][1] !=
+                first[1] + nbins * first[0].itemsize):
+            break
+        nbins += 1
+
+    return np.ndarray((data.shape[0], nbins),
+                      dtype=first[0],
+                      buffer=data,
+                      offset=first[1],
+                      strides=(data.dtype.itemsize, first[0].itemsize))
+
+
+def ReadTOB1Chunks(filename,
+                   chunksize=2**16,
+                   grouparrays=True,
+                   ):
+    # iterate over a TOB1 file in chunks of chunksize records, the chunks
+    # are views of the memory mapped file so only the chunk that is worked
+    # on is actually read from disk
+    data, header = ReadTOB1(filename, memmap=True, grouparrays=grouparrays)
+    for start in range(0, data.shape[0], chunksize):
+        yield data[start:start + chunksize]
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rebinning of bin counts by a weight matrix (old bins x new bins).
+
+The rebinning of Gonser2011 and Spiegel2012 is kept as the table from the
+papers and turned once into a 30 x 23 matrix, so rebinning any number of
+records is a single matrix multiplication. OverlapMatrix builds the same
+kind of matrix for any old/new bin borders from the overlap fraction of
+the bins, for the table of the papers it gives the same weights.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+from BinGeometry import BinGeometry, CDP2_BINSIZES
+from Kernels import Backend, JitRebin
+from Sparse import SparseBins, SparseApply
+
+# directly from paper applied onto the 30 CDP bins, the same table is
+# used in Gonser2011 and Spiegel2012
+# take note that this will also mean, that the passed in bins to
+# all derived quantities like LWC/Conc need to be adjusted for
+# the proper calculations thereof
+# new upper binsize: [[old bin index, weight], ...]
+REBIN_TABLE = {
+    2.66: [[0, 0.66]],
+    4.66: [[0, 0.34], [1, 1.0], [2, 0.66]],
+    7.41: [[2, 0.34], [3, 1.0], [4, 1], [5, 0.41]],
+    9.66: [[5, 0.59], [6, 1.0], [7, 0.66]],
+    11.36: [[7, 0.34], [8, 1.0], [9, 0.36]],
+    13.21: [[9, 0.64], [10, 1.0], [11, 0.21]],
+    15.26: [[11, 0.79], [12, 1.26 / 2]],
+    18.01: [[12, 0.74 / 2], [13, 1.0], [14, 0.01 / 2]],
+    19.96: [[14, 1.95 / 2]],
+    21.96: [[14, 0.04 / 2], [15, 1.96 / 2]],
+    23.61: [[15, 0.04 / 2], [16, 1.61 / 2]],
+    25.01: [[16, 0.39 / 2], [17, 1.01 / 2]],
+    26.51: [[17, 0.99 / 2], [18, 0.51 / 2]],
+    28.46: [[18, 1.49 / 2], [19, 0.46 / 2]],
+    30.51: [[19, 1.54 / 2], [20, 0.51 / 2]],
+    33.36: [[20, 1.49 / 2], [21, 1.36 / 2]],
+    35.26: [[21, 0.64 / 2], [22, 1.26 / 2]],
+    37.06: [[22, 0.74 / 2], [23, 1.06 / 2]],
+    39.01: [[23, 0.94 / 2], [24, 1.01 / 2]],
+    41.11: [[24, 0.99 / 2], [25, 1.11 / 2]],
+    43.76: [[25, 0.89 / 2], [26, 1.76 / 2]],
+    46.41: [[26, 0.24 / 2], [27, 1.0], [28, 0.41 / 2]],
+    50: [[28, 1.59 / 2], [29, 1.0]],
+}
+
+# lower border of the first bin is the ADC treshold as for the CDP bins
+REBIN_BINSIZES = [2.0] + list(REBIN_TABLE.keys())
+
+# matrices are only built once, keyed by the old and new binsizes
+_MATRIXCACHE = {}
+
+
+def _readonly(matrix):
+    matrix.flags.writeable = False
+    return matrix
+
+
+def TableMatrix(table=REBIN_TABLE, noldbins=len(CDP2_BINSIZES) - 1):
+    # turn a table of new bin: [[old bin, weight], ...] into a matrix
+    key = ('table', noldbins,
+           tuple((newbinsize, tuple(tuple(_) for _ in pairs))
+                 for newbinsize, pairs in table.items()))
+    if key not in _MATRIXCACHE:
+        matrix = np.zeros((noldbins, len(table)))
+        for newbinno, newbinsize in enumerate(table.keys()):
+            for oldbinno, weight in table[newbinsize]:
+                matrix[oldbinno, newbinno] += weight
+        _MATRIXCACHE[key] = _readonly(matrix)
+    return _MATRIXCACHE[key]
+
+
+def OverlapMatrix(oldbinsizes=CDP2_BINSIZES, newbinsizes=REBIN_BINSIZES):
+    # weight of each old bin in each new bin, given by the fraction of the
+    # old bin that lies within the new bin, i.e. counts are assumed to be
+    # evenly spread within an old bin
+    # both binsizes can also be a BinGeometry or the name of a preset
+    old = BinGeometry(oldbinsizes)
+    new = BinGeometry(newbinsizes)
+    key = ('overlap', id(old), id(new))
+    if key not in _MATRIXCACHE:
+        lower = np.maximum(old.binsizes[:-1, np.newaxis],
+                           new.binsizes[np.newaxis, :-1])
+        upper = np.minimum(old.binsizes[1:, np.newaxis],
+                           new.binsizes[np.newaxis, 1:])
+        matrix = np.clip(upper - lower, 0, None)
+        matrix /= old.widths[:, np.newaxis]
+        _MATRIXCACHE[key] = _readonly(matrix)
+    return _MATRIXCACHE[key]
+
+
+def Rebin(bincounts, matrix=None, binaxis=-1, backend=None):
+    if isinstance(bincounts, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(Rebin, bincounts, matrix=matrix, backend=backend)
+
+    # rebin records x old bins with a (old bins x new bins) weight matrix
+    # defaults to the table of Gonser2011/Spiegel2012
+    # the bins can be along any axis of an N-D array (binaxis), the new
+    # bins are put where the old ones were
+    # backend 'numba' loops over the non zero weights only (see Kernels)
+    if matrix is None:
+        matrix = TableMatrix()
+
+    # the matrix multiplication works over all leading axes at once
+    bincounts = np.moveaxis(np.asarray(bincounts), binaxis, -1)
+    if Backend(backend) == 'numba':
+        output = JitRebin(bincounts, matrix)
+    elif bincounts.dtype.kind != 'f' or not np.isnan(bincounts).any():
+        output = bincounts @ matrix
+    else:
+        # nan in one old bin should only spoil the new bins it contributes
+        # to and not all of them as nan * 0 would do in the multiplication
+        nans = np.isnan(bincounts)
+        output = np.where(nans, 0, bincounts) @ matrix
+        output[(nans @ (matrix != 0))] = np.nan
+    return np.moveaxis(output, -1, binaxis)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic CDP responses for load tests and as test data for the
+processing functions, without the instrument.
+
+LognormalBins draws bin counts of a lognormal fog droplet distribution,
+EncodePackets turns them into 156 byte responses with exactly the byte
+order that DecodeRaw (and the logger program) decodes, including the
+bins with their high word MSB first. Checksums are valid or deliberately
+broken for a given fraction of the records.
+
+SimulatedCDP answers the setup and data commands like the instrument. It
+can be used in memory through MemoryPort, which has the same interface as
+Acquisition.SerialPort, or on the master side of a pty (ServePty):
+
+    device, stop = ServePty(SimulatedCDP(median=12, broken=0.01))
+    records = Acquire(device, nrecords=1000, frequency=100)
+    stop()
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import math
+
+import numpy as np
+
+from BinGeometry import BinGeometry
+from DecodeRaw import PACKET_LENGTH
+
+# raw counts of the housekeeping channels that give plausible values after
+# ConvertHousekeeping (about 100 mA, 2 V, 25 °C, 25 °C, 0.1 V, 0.1 V, 5 V
+# and 25 °C)
+HOUSEKEEPING_RAW = [1640, 1638, 2048, 2048, 82, 82, 2048, 2575]
+
+# raw quality values (bandwidth, treshold, transit, dt bandwidth, dynamic
+# treshold)
+QUALITY_RAW = [100, 100, 50, 100, 100]
+
+
+def LognormalBins(nrecords=1,
+                  conc=100,  # as # / cm^3
+                  median=10,  # median diameter in micrometer
+                  gsd=1.5,  # geometric standard deviation
+                  binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14,
+                            16, 18, 20, 22, 24, 26, 28, 30, 32, 34, 36,
+                            38, 40, 42, 44, 46, 48, 50],
+                  windspeed=[1],  # in m/s
+                  samplearea=0.298,  # as area in square millimeters
+                  samplefrequency=10,  # as Hz
+                  rng=None,
+                  ):
+    # poisson distributed counts per record and bin for a lognormal number
+    # distribution, conc, median, gsd and windspeed can be given per record
+    from ConcPerCCM import SampleVolume
+    geometry = BinGeometry(binsizes)
+    rng = np.random.default_rng(rng)
+
+    volume = SampleVolume(windspeed=windspeed,
+                          samplearea=samplearea,
+                          samplefrequency=samplefrequency)
+    expected = np.nan_to_num(np.asarray(conc, dtype=float) * volume)
+
+    median = np.asarray(median, dtype=float)[..., np.newaxis]
+    sigma = np.log(np.asarray(gsd, dtype=float))[..., np.newaxis]
+    erf = np.vectorize(math.erf, otypes=[float])
+    cdf = 0.5 * (1 + erf((np.log(geometry.binsizes) - np.log(median)) /
+                         (np.sqrt(2) * sigma)))
+    fractions = np.diff(cdf, axis=-1)
+
+    expected = np.broadcast_to(expected[..., np.newaxis] * fractions,
+                               (nrecords, geometry.nbins))
+    return rng.poisson(expected).astype(np.uint32)
+
+
+def EncodePackets(bincounts,
+                  housekeeping=HOUSEKEEPING_RAW,
+                  dof_reject=0,
+                  quality=QUALITY_RAW,
+                  adc_overflow=0,
+                  broken=0.0,
+                  rng=None,
+                  ):
+    # records x 156 bytes of cdp responses for records x 30 bin counts
+    # housekeeping, quality, dof_reject and adc_overflow are raw counts,
+    # either the same for all or given per record
+    # broken is the fraction of records (or a mask) with a wrong checksum
+    bincounts = np.atleast_2d(np.asarray(bincounts, dtype=np.uint32))
+    nrecords = bincounts.shape[0]
+    if bincounts.shape[1] != 30:
+        raise ValueError('The cdp sends 30 bins, got ' +
+                         str(bincounts.shape[1]))
+
+    packets = np.zeros((nrecords, PACKET_LENGTH), dtype=np.uint8)
+    words = packets.view('<u2')
+
+    def _long(start, values):
+        # 32 bit counts as high word and low word
+        values = np.asarray(values, dtype=np.uint32)
+        words[:, start] = values >> 16
+        words[:, start + 1] = values & 0xFFFF
+
+    words[:, 0:8] = housekeeping
+    _long(8, dof_reject)
+    words[:, 10:15] = quality
+    _long(15, adc_overflow)
+
+    # the logger (and so DecodeRaw) reads the high word of the bins MSB
+    # first, it is written in the same way to give the same counts back
+    high = (bincounts >> 16).astype('>u2')
+    packets[:, 34:154:4] = high.view(np.uint8)[:, 0::2]
+    packets[:, 35:154:4] = high.view(np.uint8)[:, 1::2]
+    words[:, 18:77:2] = bincounts & 0xFFFF
+
+    chksum = packets[:, :PACKET_LENGTH - 2].sum(axis=1, dtype=np.uint32)
+    chksum &= 0xFFFF
+
+    if np.ndim(broken) == 0:
+        broken = np.random.default_rng(rng).random(nrecords) < broken
+    chksum[np.asarray(broken, dtype=bool)] ^= 0x5A5A
+    words[:, 77] = chksum
+
+    return packets
+
+
+def SimulatedPackets(nrecords,
+                     broken=0.0,
+                     rng=None,
+                     **kwargs,
+                     ):
+    # records x 156 bytes with bins following LognormalBins(**kwargs)
+    rng = np.random.default_rng(rng)
+    return EncodePackets(LognormalBins(nrecords, rng=rng, **kwargs),
+                         broken=broken, rng=rng)
+
+
+class SimulatedCDP:
+    # answers the commands of the logger program like the cdp, feed()
+    # takes the bytes sent to the instrument and returns its answer
+    # it answers as fast as it is polled, so polling at 100 - 1000 Hz gives
+    # 10 - 100 times real time of the 10 Hz acquisition
+    def __init__(self,
+                 firmware=0x0102,
+                 broken=0.0,
+                 nak=0,
+                 blocksize=2**10,
+                 rng=None,
+                 **kwargs,
+                 ):
+        from Acquisition import SetupCommand
+        self.firmware = firmware
+        self.broken = broken
+        # number of setup commands answered with NAK before the ACK
+        self.nak = nak
+        self.blocksize = blocksize
+        self.rng = np.random.default_rng(rng)
+        self.kwargs = kwargs
+        self.setupcommand = SetupCommand()
+        self.received = bytearray()
+        self.packets = np.zeros((0, PACKET_LENGTH), dtype=np.uint8)
+        self.sent = 0
+
+    def packet(self):
+        # the next response, made in blocks so it is fast at high rates
+        if self.sent % self.blocksize == 0:
+            self.packets = SimulatedPackets(self.blocksize,
+                                            broken=self.broken,
+                                            rng=self.rng,
+                                            **self.kwargs)
+        packet = self.packets[self.sent % self.blocksize].tobytes()
+        self.sent += 1
+        return packet
+
+    def feed(self, data):
+        from Acquisition import CMD_DATA, CDP_ACK, CDP_NAK
+        self.received += data
+        answer = b''
+        while self.received:
+            if self.received.startswith(self.setupcommand):
+                del self.received[:len(self.setupcommand)]
+                if self.nak > 0:
+                    self.nak -= 1
+                    answer += CDP_NAK + bytes(2)
+                else:
+                    answer += CDP_ACK + self.firmware.to_bytes(2, 'big')
+            elif self.received.startswith(CMD_DATA):
+                del self.received[:len(CMD_DATA)]
+                answer += self.packet()
+            elif (self.setupcommand.startswith(self.received) or
+                  CMD_DATA.startswith(self.received)):
+                # wait for the rest of the command
+                break
+            else:
+                # unknown byte, dropped like the cdp would
+                del self.received[:1]
+        return answer
+
+
+class MemoryPort:
+    # in memory stand-in for Acquisition.SerialPort talking to a
+    # SimulatedCDP, the answer is available right after a write
+    def __init__(self, instrument=None, buffersize=8192):
+        self.instrument = instrument or SimulatedCDP()
+        self.buffersize = buffersize
+        self.buffer = bytearray()
+
+    async def write(self, data):
+        # a coroutine as SerialPort.write, nothing has to be waited for
+        self.buffer += self.instrument.feed(bytes(data))
+        if len(self.buffer) > self.buffersize:
+            del self.buffer[:len(self.buffer) - self.buffersize]
+
+    def inwaiting(self):
+        return len(self.buffer)
+
+    def read(self, n):
+        data = bytes(self.buffer[:n])
+        del self.buffer[:n]
+        return data
+
+    def flush(self):
+        self.buffer.clear()
+
+    def close(self):
+        pass
+
+
+def ServePty(instrument=None):
+    # run a SimulatedCDP on the master side of a new pty in a thread,
+    # returns the name of the slave device and a function to stop it
+    import os
+    import pty
+    import select
+    import threading
+    import tty
+
+    instrument = instrument or SimulatedCDP()
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    device = os.ttyname(slave)
+    stopped = threading.Event()
+
+    def _serve():
+        while not stopped.is_set():
+            ready, _, _ = select.select([master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                answer = instrument.feed(os.read(master, 4096))
+                if answer:
+                    os.write(master, answer)
+            except OSError:
+                break
+
+    thread = threading.Thread(target=_serve, daemon=True)
+    thread.start()
+
+    def stop():
+        stopped.set()
+        thread.join()
+        os.close(master)
+        os.close(slave)
+
+    return device, stop
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sparse representation of bin counts for data that is mostly without fog.
+
+Outside of fog events most records have no counts in any bin. SparseBins
+keeps only the records with counts (their row index and the compact
+counts), the empty records are known to give 0 for all derived quantities
+(concentration, LWC, MVD, ED, FluxGrav) and are never touched.
+
+ConcPerCCM, LWC, MVD, ED, FluxGrav, conc2visibility, ComputeAll and Rebin
+(so also Gonser2011/Spiegel2012) accept a SparseBins instead of the
+records x bins array. Per bin results are again SparseBins (so they can be
+passed on, e.g. to MVD), results per record are full arrays with 0 (inf
+for the visibility) for the empty records.
+
+    bins = SparseBins(data['cdp_data_bincount'])
+    lwc = LWC(bins, data_is_conc=False, windspeed=windspeed,
+              combined=False)
+    mvd = MVD(lwc)
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+# arguments that are given per record and have to follow the rows
+PERRECORD = ['windspeed', 'T']
+
+
+class SparseBins(object):
+    # rows are the indices of the records with counts, counts the compact
+    # (rows x bins) counts of these records, nrecords the number of all
+    # records
+    __slots__ = ['rows', 'counts', 'nrecords']
+
+    def __init__(self, bins=None, rows=None, counts=None, nrecords=None):
+        if bins is not None:
+            bins = np.asarray(bins)
+            if bins.ndim == 1:
+                bins = bins[np.newaxis, :]
+            # nan counts as occupied, it has to show up in the results
+            occupied = np.any(bins != 0, axis=1)
+            rows = np.flatnonzero(occupied)
+            counts = bins[rows]
+            nrecords = bins.shape[0]
+        self.rows = np.asarray(rows, dtype=np.intp)
+        self.counts = np.asarray(counts)
+        self.nrecords = int(nrecords)
+
+    @property
+    def shape(self):
+        return (self.nrecords, self.counts.shape[1])
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def dtype(self):
+        return self.counts.dtype
+
+    @property
+    def occupancy(self):
+        # fraction of the records with counts
+        return self.rows.shape[0] / self.nrecords if self.nrecords else 0.
+
+    def __len__(self):
+        return self.nrecords
+
+    def __repr__(self):
+        return ('SparseBins(' + str(self.rows.shape[0]) + ' of ' +
+                str(self.nrecords) + ' records x ' +
+                str(self.counts.shape[1]) + ' bins)')
+
+    def todense(self, out=None):
+        if out is None:
+            out = np.zeros(self.shape, dtype=self.counts.dtype)
+        else:
+            out[:] = 0
+        out[self.rows] = self.counts
+        return out
+
+    def like(self, counts):
+        # SparseBins with the same rows and other (per bin) values
+        return SparseBins(rows=self.rows, counts=counts,
+                          nrecords=self.nrecords)
+
+    def scatter(self, values, fill=0, out=None):
+        # full array of per record values given for the occupied rows
+        values = np.asarray(values)
+        if out is None:
+            out = np.empty((self.nrecords,) + values.shape[1:],
+                           dtype=np.result_type(values, type(fill)))
+        out[:] = fill
+        out[self.rows] = values
+        return out
+
+    def take(self, values):
+        # the values of the occupied rows if given per record
+        values = np.asarray(values)
+        if values.ndim == 0 or values.shape[0] != self.nrecords:
+            return values
+        return values[self.rows]
+
+
+def SparseApply(func, sparse, fill=0, out=None, **kwargs):
+    # call func on the compact counts and bring the results back to all
+    # records, per record arguments (PERRECORD) are taken for the rows
+    counts = sparse.counts
+    empty = sparse.rows.shape[0] == 0
+    if empty:
+        # nothing to do, but the functions do not take zero records, so
+        # one empty record gives the shape and type of the results
+        counts = np.zeros((1, counts.shape[1]), dtype=counts.dtype)
+
+    for name in PERRECORD:
+        if name in kwargs and kwargs[name] is not None:
+            values = sparse.take(kwargs[name])
+            if empty and values.ndim > 0:
+                values = (np.asarray(kwargs[name])[:1] if
+                          np.size(kwargs[name]) else [1])
+            kwargs[name] = values
+
+    result = func(counts, **kwargs)
+    return _expand(sparse, result, fill, out)
+
+
+def _expand(sparse, result, fill=0, out=None):
+    if result is False:
+        return result
+    if isinstance(result, dict):
+        return {name: _expand(sparse, values, fill,
+                              None if out is None else out.get(name))
+                for name, values in result.items()}
+    if isinstance(result, tuple):
+        return tuple(_expand(sparse, _, fill) for _ in result)
+    if isinstance(result, list):
+        # e.g. the new binsizes of Gonser2011
+        return result
+    result = np.asarray(result)[:sparse.rows.shape[0]]
+    if result.ndim == 2:
+        if out is not None:
+            # a preallocated output gets the full records x bins
+            out[:] = 0
+            out[sparse.rows] = result
+            return out
+        return sparse.like(result)
+    return sparse.scatter(result, fill=fill, out=out)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Alignment of an external windspeed series (e.g. the Young sonic or a
+separate pitot/anemometer logger) onto the timestamps of the CDP records.
+
+Both series have to be sorted by time. The matching is done with
+np.searchsorted of the CDP times in the wind times:
+    'asof'         last wind value at or before the record
+    'nearest'      closest wind value
+    'interpolate'  linear interpolation between the wind values around it
+A tolerance (in s) limits how far the wind value(s) may be from the record,
+records without a match get nan and are False in the returned mask.
+
+WindJoin does the same chunk by chunk and can be given as windspeed to
+StreamCampaign/BatchProcess, it only looks at the part of the wind series
+that covers the chunk:
+
+    wind = WindJoin(sonictime, sonicspeed, method='interpolate',
+                    tolerance=1)
+    results = StreamCampaign(files, windspeed=wind)
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+
+WIND_METHODS = ['asof', 'nearest', 'interpolate']
+
+
+def AlignWind(time,
+              windtime,
+              windspeed,
+              method='nearest',
+              tolerance=None,  # in s
+              ):
+    # windspeed at time from the series windtime/windspeed, returns the
+    # windspeed and a mask of the records that got a (valid) value
+    time = np.asarray(time, dtype=np.float64)
+    windtime = np.asarray(windtime, dtype=np.float64)
+    windspeed = np.asarray(windspeed, dtype=np.float64)
+
+    if method not in WIND_METHODS:
+        raise ValueError('method must be one of ' + ', '.join(WIND_METHODS))
+
+    aligned = np.full(time.shape, np.nan)
+    valid = np.zeros(time.shape, dtype=bool)
+    nwind = windtime.shape[0]
+    if nwind == 0 or time.shape[0] == 0:
+        return aligned, valid
+
+    # index of the first wind value after the record, i.e. ix - 1 is the
+    # last one at or before it
+    ix = np.searchsorted(windtime, time, side='right')
+    before = ix - 1
+    after = np.minimum(ix, nwind - 1)
+    hasbefore = before >= 0
+    hasafter = ix < nwind
+    before = np.maximum(before, 0)
+
+    if method == 'asof':
+        match = before
+        valid = hasbefore
+        distance = time - windtime[match]
+    elif method == 'nearest':
+        dbefore = np.where(hasbefore, time - windtime[before], np.inf)
+        dafter = np.where(hasafter, windtime[after] - time, np.inf)
+        # ties go to the earlier value
+        match = np.where(dafter < dbefore, after, before)
+        distance = np.minimum(dbefore, dafter)
+        valid = np.isfinite(distance)
+    else:
+        # a record exactly on a wind value has that one as before
+        exact = hasbefore & (windtime[before] == time)
+        valid = exact | (hasbefore & hasafter)
+        span = windtime[after] - windtime[before]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(exact | (span <= 0), 0,
+                              (time - windtime[before]) / span)
+        interpolated = (windspeed[before] * (1 - weight) +
+                        windspeed[after] * weight)
+        # the gap between the two wind values is what counts
+        distance = np.where(exact, 0, span)
+
+    if tolerance is not None:
+        valid &= distance <= tolerance
+
+    if method == 'interpolate':
+        aligned[valid] = interpolated[valid]
+    else:
+        aligned[valid] = windspeed[match[valid]]
+
+    # nan in the wind series stays a gap
+    valid &= np.isfinite(aligned)
+    return aligned, valid
+
+
+class WindJoin:
+    # aligns the wind series onto chunks of records in time order, called
+    # with a chunk of a TOB1 table (or an array of times) it returns the
+    # windspeed per record, the mask of the last call is kept in valid
+    def __init__(self,
+                 windtime,
+                 windspeed,
+                 method='nearest',
+                 tolerance=None,  # in s
+                 fill=np.nan,
+                 ):
+        self.windtime = np.asarray(windtime, dtype=np.float64)
+        self.windspeed = np.asarray(windspeed, dtype=np.float64)
+        if np.any(self.windtime[1:] < self.windtime[:-1]):
+            raise ValueError('The wind series needs to be sorted by time')
+        self.method = method
+        self.tolerance = tolerance
+        # what records without wind get, nan gives a concentration of 0
+        self.fill = fill
+        self.valid = np.zeros(0, dtype=bool)
+        self.gaps = 0
+
+    def settings(self):
+        # what the aligned values depend on, e.g. to compare stored results
+        # (valid and gaps change with every call)
+        return {'windtime': self.windtime, 'windspeed': self.windspeed,
+                'method': self.method, 'tolerance': self.tolerance,
+                'fill': self.fill}
+
+    def align(self, time):
+        time = np.asarray(time, dtype=np.float64)
+        if time.shape[0] == 0:
+            self.valid = np.zeros(0, dtype=bool)
+            return np.zeros(0)
+
+        # only the wind values that can match a record of this chunk, one
+        # before and after the chunk are needed for asof/interpolate
+        margin = np.inf if self.tolerance is None else self.tolerance
+        start = np.searchsorted(self.windtime, np.nanmin(time) - margin,
+                                side='left')
+        stop = np.searchsorted(self.windtime, np.nanmax(time) + margin,
+                               side='right')
+        start = max(0, start - 1)
+        stop = min(self.windtime.shape[0], stop + 1)
+
+        aligned, valid = AlignWind(time,
+                                   self.windtime[start:stop],
+                                   self.windspeed[start:stop],
+                                   method=self.method,
+                                   tolerance=self.tolerance)
+        aligned[~valid] = self.fill
+        self.valid = valid
+        self.gaps += int(valid.shape[0] - np.count_nonzero(valid))
+        return aligned
+
+    def __call__(self, chunk):
+        if getattr(chunk, 'dtype', None) is not None and chunk.dtype.names:
+            from Pipeline import ChunkTime
+            return self.align(ChunkTime(chunk))
+        return self.align(chunk)
@@ -31,21 +31,27 @@
 # values and a mulitiplication of all values does not impact this
 import numpy as np
 
-
-def ConcPerCCM(bins,
-               windspeed=[1],  # in m/s
-               samplearea=0.298,  # as area in square millimeters
-               samplefrequency=10,  # as Hz
-               combined=True):
-
+from BinAxis import BinAxisApply, IsRecords
+from BinGeometry import BinGeometry
+from DiameterQuantiles import DiameterQuantiles
+from Meteo import gravity, airdensity, waterdensity, viscosityair
+from Mie import MieExtinctionTable, MIE_CACHEDIR, WATER_REFRACTIVEINDEX
+from Moments import Moments, WeightedSum
+from Parallel import ParallelRows, SliceRows
+from Rebin import Rebin, TableMatrix, REBIN_TABLE, REBIN_BINSIZES
+from Sparse import SparseBins, SparseApply
+
+
+def SampleVolume(windspeed=[1],  # in m/s
+                 samplearea=0.298,  # as area in square millimeters
+                 samplefrequency=10,  # as Hz
+                 ):
+    # the volume in cm^3 that passed the sample area during one sample
     # windspeed defaults to 1 meter per seconds windspeed
     # samplearea defaults to 0.298 as given by CDP specs
     # make cm/s out of it
-    windspeed = (
-        windspeed.copy()
-        if type(windspeed) == np.ndarray
-        else np.asarray(windspeed, dtype=np.float)
-    )
+    # no copy needed, the scaling below gives a new array anyway
+    windspeed = np.asarray(windspeed, dtype=float)
 
     # convert windspeed first to cm per s and then to cm adjusted to
     # sampling frequency, as we look for cm and we still have cm/s
@@ -64,21 +70,70 @@ def ConcPerCCM(bins,
               '\n Make sure all parameters are proper',
               '*' * 30)
 
-    samplearea /= 10**2  # make cm instead of millimeters out of it
-    volume = windspeed * samplearea  # make a volume out of it
+    # make cm instead of millimeters out of it (not in place, samplearea
+    # can be an array per record or station)
+    samplearea = np.asarray(samplearea, dtype=float) / 10**2
+    # make a volume out of it, at least 1d so that scalars work as well
+    volume = np.atleast_1d(windspeed * samplearea)
 
     # set volume to nan if its zero because then its not physically correct
     volume[volume == 0] = np.nan
 
-    if combined:
-        concperccm = np.nansum(bins, axis=1) / volume
-    else:
-        concperccm = bins / np.repeat(volume[:, np.newaxis],
-                                      bins.shape[1], axis=1)
+    return volume
+
+
+def ConcPerCCM(bins,
+               windspeed=[1],  # in m/s
+               samplearea=0.298,  # as area in square millimeters
+               samplefrequency=10,  # as Hz
+               combined=True,
+               n_jobs=1,
+               out=None,
+               binaxis=-1,
+               ):
+
+    if isinstance(bins, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(ConcPerCCM, bins, out=out, windspeed=windspeed,
+                           samplearea=samplearea,
+                           samplefrequency=samplefrequency,
+                           combined=combined,
+                           n_jobs=n_jobs)
+    if not IsRecords(bins, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(ConcPerCCM, bins, binaxis, out=out,
+                            windspeed=windspeed,
+                            samplearea=samplearea,
+                            samplefrequency=samplefrequency,
+                            combined=combined,
+                            n_jobs=n_jobs)
+
+    # n_jobs > 1 (or None/-1 for all cores) works on blocks of records in
+    # threads, out can be a preallocated array for the result
+    volume = SampleVolume(windspeed=windspeed,
+                          samplearea=samplearea,
+                          samplefrequency=samplefrequency)
+    bins = np.atleast_2d(bins)
+    nrecords = max(bins.shape[0], volume.shape[0])
+
+    if out is None:
+        out = np.empty((nrecords,) if combined else
+                       (nrecords, bins.shape[1]))
 
-    concperccm = np.nan_to_num(concperccm)
+    def _kernel(rows):
+        _bins = SliceRows(bins, rows)
+        _volume = SliceRows(volume, rows)
+        if combined:
+            np.divide(np.nansum(_bins, axis=1), _volume, out=out[rows])
+        else:
+            # broadcast the volume over the bins instead of repeating it
+            np.divide(_bins, _volume[..., np.newaxis], out=out[rows])
+        # out is our own array, so this can be done in place
+        np.nan_to_num(out[rows], copy=False)
 
-    return concperccm
+    ParallelRows(_kernel, nrecords, n_jobs=n_jobs)
+
+    return out
 
 
 def ED(bins,
@@ -86,31 +141,38 @@ def ED(bins,
        # the lower binborder
        binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16, 18, 20,
                  22, 24, 26, 28, 30, 32, 34, 36, 38, 40, 42, 44, 46, 48, 50],
-       binsize_as_diameter=True):
+       binsize_as_diameter=True,
+       binaxis=-1):
+
+    if isinstance(bins, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(ED, bins, binsizes=binsizes,
+                           binsize_as_diameter=binsize_as_diameter)
+    if not IsRecords(bins, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(ED, bins, binaxis, binsizes=binsizes,
+                            binsize_as_diameter=binsize_as_diameter)
+
+    # binsizes can also be a BinGeometry or the name of a preset
+    geometry = BinGeometry(binsizes)
+    bins = np.atleast_2d(bins)
 
     # binsizes are NOT the treshold values that are sent via setup cmd
-    if len(binsizes) < bins.shape[1]:
-        print('binsizes length must be at least one longer than bins length')
+    if geometry.nbins != bins.shape[1]:
+        print('binsizes length must be one longer than length of bins')
         return False
 
-    midpoints = [(binsizes[_+1]+binsizes[_])/2 for _ in range(len(binsizes)-1)]
-    if binsize_as_diameter:
-        midpoints = [midpoint/2 for midpoint in midpoints]
-
-    _r2 = np.zeros(bins.shape)
-    _r3 = np.zeros(bins.shape)
-
-    # midpoints divided by 1000 as a security precaution of float overflow
-    for mno, midp in enumerate(midpoints):
-        _r2[:, mno] = bins[:, mno].squeeze() * midp**2
-        _r3[:, mno] = bins[:, mno].squeeze() * midp**3
+    # 2nd and 3rd moment with one multiplication of the bins with the
+    # powers of the midpoints (radius, or diameter if binsize_as_diameter
+    # is False)
+    _moments = Moments(bins, [2, 3], geometry, radius=binsize_as_diameter)
 
     # set stuff with zero to -1 so we know that negative numbers
     # which are not possible here were once zero and can be set to that after
     # the division
 
-    _r2 = np.nansum(_r2, axis=1)
-    _r3 = np.nansum(_r3, axis=1)
+    _r2 = _moments[:, 0]
+    _r3 = _moments[:, 1]
     _r2[_r2 == 0] = -1.0
     ed = _r3/_r2 * 2
     ed[ed < 0] = 0
@@ -127,8 +189,33 @@ def LWC(inputdata, # needs to be in # / m^3
         samplefrequency=10,
         combined=True,
         quiet=True,
+        n_jobs=1,
+        out=None,
+        binaxis=-1,
         ):
-    inputdata = inputdata.copy()
+    if isinstance(inputdata, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(LWC, inputdata, out=out, data_is_conc=data_is_conc,
+                           binsizes=binsizes,
+                           windspeed=windspeed,
+                           samplearea=samplearea,
+                           samplefrequency=samplefrequency,
+                           combined=combined,
+                           quiet=quiet,
+                           n_jobs=n_jobs)
+    if not IsRecords(inputdata, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(LWC, inputdata, binaxis, out=out,
+                            data_is_conc=data_is_conc,
+                            binsizes=binsizes,
+                            windspeed=windspeed,
+                            samplearea=samplearea,
+                            samplefrequency=samplefrequency,
+                            combined=combined,
+                            quiet=quiet,
+                            n_jobs=n_jobs)
+
+    # inputdata is never changed in place, so it does not need a copy
     # binsizes are NOT the treshold values that are sent via setup cmd
     if not data_is_conc:
         _lwc = ConcPerCCM(inputdata,
@@ -136,40 +223,57 @@ def LWC(inputdata, # needs to be in # / m^3
                           samplearea=samplearea,
                           samplefrequency=samplefrequency,
                           combined=False,
+                          n_jobs=n_jobs,
                           )
         # if you have given bins directly, ConcPerCCM will give you back #/cm^3
         # which we need to scale for the LWC
 
         # convert the concentration from cm^3 (default) to m^3
         # as we get per cm^3 from ConcPerCCM (as the name implies)
-        _lwc *= 10**6
+        scale = 10**6
 
     else:
-        _lwc = np.asarray(inputdata, np.float)
+        _lwc = np.asarray(inputdata, float)
+        scale = None
 
-    if len(binsizes) < _lwc.shape[1]:
+    # binsizes can also be a BinGeometry or the name of a preset
+    geometry = BinGeometry(binsizes)
+
+    if geometry.nbins != _lwc.shape[1]:
         print('binsizes length must be one longer than length of bins')
         return False
 
-    # midpoints are in micrometers
-    midpoints = [sum(_)/2 for _ in zip(binsizes[1:], binsizes[:-1])]
-
-    dropsize = [(midpoint)**3 * np.pi/6 * 10**-12 for midpoint in midpoints]
-
-    dropsize = np.asarray(dropsize)
+    # volume of the droplets at the midpoints (in micrometers) in cm^3
+    dropsize = geometry.dropvolume
 
-    if np.nanmax(_lwc) > 200000 and not quiet:
+    if not quiet and np.nanmax(_lwc) * (scale or 1) > 200000:
         print('Warning from LWC():')
         print('Are you sure the concentration is in # / m^3?')
-        print('It seems somewhat high with a max of', np.nanmax(_lwc))
+        print('It seems somewhat high with a max of',
+              np.nanmax(_lwc) * (scale or 1))
 
-    if type(_lwc) != np.ndarray:
-        _lwc = np.asarray(_lwc, dtype=np.float)
+    if out is None:
+        if combined:
+            out = np.empty(_lwc.shape[0])
+        else:
+            # the concentration calculated above is our own array
+            out = _lwc if scale is not None else np.empty(_lwc.shape)
 
-    _lwc = (_lwc * dropsize)
+    def _kernel(rows):
+        # works on n_jobs blocks of records, see ConcPerCCM
+        _block = _lwc[rows]
+        if scale is not None:
+            _block = np.multiply(_block, scale,
+                                 out=None if combined else out[rows])
+        # choose either the sum of bins for a record or the single bins
+        if combined:
+            np.nansum(_block * dropsize, axis=1, out=out[rows])
+        else:
+            np.multiply(_block, dropsize, out=out[rows])
 
-    # choose either the sum of bins for a record or the single bins
-    return np.nansum(_lwc, axis=1) if combined else _lwc
+    ParallelRows(_kernel, _lwc.shape[0], n_jobs=n_jobs)
+
+    return out
 
 
 
@@ -182,13 +286,36 @@ def MVD(inputdata,
         windspeed=[1],  # in m/s
         samplearea=0.298,  # as area in square millimeters
         samplefrequency=0.1,
+        n_jobs=1,
+        out=None,
+        binaxis=-1,
         ):
 
+    if isinstance(inputdata, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(MVD, inputdata, out=out, data_is_lwc=data_is_lwc,
+                           data_is_conc=data_is_conc,
+                           binsizes=binsizes,
+                           windspeed=windspeed,
+                           samplearea=samplearea,
+                           samplefrequency=samplefrequency,
+                           n_jobs=n_jobs)
+    if not IsRecords(inputdata, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(MVD, inputdata, binaxis, out=out,
+                            data_is_lwc=data_is_lwc,
+                            data_is_conc=data_is_conc,
+                            binsizes=binsizes,
+                            windspeed=windspeed,
+                            samplearea=samplearea,
+                            samplefrequency=samplefrequency,
+                            n_jobs=n_jobs)
+
     # if the data is a concentration it cannot be a lwc
     if data_is_conc:
         data_is_lwc = False
 
-    inputdata = inputdata.copy()
+    # no copy of inputdata needed, it is not changed in place
 
     if data_is_lwc:
         # data is as we expect it usually, and we can go on
@@ -203,6 +330,7 @@ def MVD(inputdata,
                     data_is_conc=data_is_conc,
                     binsizes=binsizes,
                     combined=False,
+                    n_jobs=n_jobs,
                     )
     else:
         # data_is_lwc and data_is_conc are set to false and we have to
@@ -212,6 +340,7 @@ def MVD(inputdata,
                             samplearea=samplearea,
                             samplefrequency=samplefrequency,
                             combined=False,
+                            n_jobs=n_jobs,
                             )
         # calculate liquid water concentration from concentration
         _lwc = LWC(_conc,
@@ -219,39 +348,29 @@ def MVD(inputdata,
                     samplefrequency=samplefrequency,
                     data_is_conc=data_is_conc,
                     binsizes=binsizes,
-                    combined=False)
-
-    _lwc = np.nan_to_num(_lwc)
-
-    if len(_lwc.shape) == 1:
-        _lwc = _lwc[np.newaxis, :]
-
-    # to be used as lookup table
-    binsizes = np.asarray(binsizes)
-
-    #adjust for when there is no lwc, and the first value is the index found
-    _lwc = np.ma.masked_array(_lwc, mask=(_lwc <= 0))
-
-    #divide the array by the respective sum to achieve a value in percent
-    pro = (_lwc.T / np.nansum(_lwc, axis=1)).T
-
-    #create an array with the time-wise sum of LWC
-    mvd = np.nancumsum(pro, axis=1)
+                    combined=False,
+                    n_jobs=n_jobs)
 
-    mvd_check = mvd.copy()
-    #change values so nanargmin works in finding the first one that is above 0.5
-    mvd_check[mvd_check < 0.5] = 1
+    # 1d input is handled as a single record
+    _lwc = np.atleast_2d(np.asarray(_lwc, dtype=float))
 
-    # gives us the indices where the first bin is above 1
-    mvd_check = np.nanargmin(mvd_check, axis=1)
+    if BinGeometry(binsizes).nbins != _lwc.shape[1]:
+        print('binsizes length must be one longer than length of bins')
+        return False
 
-    ix = np.arange(mvd.shape[0])
+    mvd = np.empty(_lwc.shape[0]) if out is None else out
 
-    # follows the formula in PADS Vers. 3.6.3
+    # the mvd is the 0.5 quantile of the lwc distribution, follows the
+    # formula in PADS Vers. 3.6.3
     # b_i + (b_i+1 - b_i) * (0.5 - cum_i-1) / pro_i
-    mvd = binsizes[mvd_check] + (binsizes[mvd_check+1] - binsizes[mvd_check]) * (0.5 - mvd[ix, mvd_check-1])/ pro[ix, mvd_check]
-    mvd[mvd.mask] = 0
-    mvd = mvd.data
+    # bins with no or negative lwc (and nan) are ignored, records
+    # without any lwc give 0
+    # with n_jobs the blocks of records are done in threads
+    ParallelRows(lambda rows: DiameterQuantiles(_lwc[rows], 0.5,
+                                                binsizes=binsizes,
+                                                weights='lwc',
+                                                out=mvd[rows]),
+                 _lwc.shape[0], n_jobs=n_jobs)
 
 
     # # #oldway to do calculation, way slower as loop goes over all records
@@ -298,13 +417,49 @@ def MVD(inputdata,
 # dx = {j: [k[i] for k in ix] for i,j in enumerate(col)}
 # import pandas as pd
 # z = pd.DataFrame(dx)
-# zz = MVD(z['LWC'].copy(), data_is_lwc=True, binsizes=z['binsize'].copy().values.T, )
-# print(zz)
+# the binsizes need the upper border of the last bin as well
+# zz = MVD(z['LWC'].copy(), data_is_lwc=True, binsizes=list(z['binsize']) + [100])
+# print(zz)  # 73.53 as 70 + 10 * (0.5 - 0.42313) / 0.21786
 
 
 # follows the Koschmeider equation, 3.91/sigma_e
-def conc2visibility():
-    pass
+def conc2visibility(conc,  # needs to be in # / cm^3 per bin
+                    binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16,
+                              18, 20, 22, 24, 26, 28, 30, 32, 34, 36, 38, 40,
+                              42, 44, 46, 48, 50],
+                    wavelength=0.55,  # in micrometer
+                    refractiveindex=WATER_REFRACTIVEINDEX,
+                    cachedir=MIE_CACHEDIR,
+                    ):
+    if isinstance(conc, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(conc2visibility, conc, fill=np.inf,
+                           binsizes=binsizes,
+                           wavelength=wavelength,
+                           refractiveindex=refractiveindex,
+                           cachedir=cachedir)
+
+    # binsizes can also be a BinGeometry or the name of a preset
+    geometry = BinGeometry(binsizes)
+
+    # the mie extinction efficiency per bin is only calculated once for
+    # each wavelength and binsizes and taken from disk afterwards
+    qext = MieExtinctionTable(geometry,
+                              wavelength=wavelength,
+                              refractiveindex=refractiveindex,
+                              cachedir=cachedir)
+
+    # extinction cross section per bin in um^2
+    crosssection = np.pi * geometry.r2 * qext
+
+    # extinction coefficient in 1 / km, as um^2 / cm^3 = 10**-3 / km
+    sigma_e = WeightedSum(conc, crosssection) * 10**-3
+
+    # visibility in km, no droplets means infinite visibility
+    with np.errstate(divide='ignore'):
+        visibility = 3.91 / sigma_e
+
+    return visibility
 
 
 def FluxGrav(lwc,
@@ -315,31 +470,49 @@ def FluxGrav(lwc,
              lat=None,
              asl=0,
              latisrad=False,
+             binaxis=-1,
              ):
 
-    import numpy as np
-    from mcr.met.constants.gravity import gravity
-    from mcr.met.density.airdensity import airdensity
-    from mcr.met.density.waterdensity import waterdensity
-    from mcr.met.constants.viscosityair import viscosityair
+    if isinstance(lwc, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(FluxGrav, lwc, T=T,
+                           binsizes=binsizes,
+                           combined=combined,
+                           lat=lat,
+                           asl=asl,
+                           latisrad=latisrad)
+    if not IsRecords(lwc, binaxis):
+        # bins along another axis or N-D arrays, see BinAxis
+        return BinAxisApply(FluxGrav, lwc, binaxis, T=T,
+                            binsizes=binsizes,
+                            combined=combined,
+                            lat=lat,
+                            asl=asl,
+                            latisrad=latisrad)
 
     # get gravity, possibly adjusted to latitude and elevation asl
+    # (only calculated once per lat/asl)
     g = gravity(lat=lat, asl=asl, latisrad=latisrad)
 
     if g >= 0:
         g *= -1
 
-    # midpoints are in micrometers, i.e. to scale to meters we need 10**-6 here
-    midpoints = [(binsizes[_+1]+binsizes[_])/2 * 10**-6
-                 for _ in range(len(binsizes)-1)]
+    # binsizes can also be a BinGeometry or the name of a preset
+    geometry = BinGeometry(binsizes)
 
-    midpoints = np.asarray(midpoints)
+    # midpoints are in micrometers, i.e. to scale the squared midpoints
+    # to meters we need 10**-12 here
+    midpoints2 = geometry.d2 * 10**-12
     # diameter is double the radius, but we already have diameter.
     # dropletdiameter = np.asarray(midpoints)*2
 
     # just make it an array.. ffs
-    if type(T) in [list, range]:
-        T = np.asarray(T)
+    T = np.asarray(T, dtype=float)
+
+    # a timeseries of temperatures (one per record) is broadcast over the
+    # bins, a single temperature or records x bins are used as they are
+    if T.ndim == 1 and T.shape[0] > 1:
+        T = T[:, np.newaxis]
 
     # ccalculate density difference
     rho_water = waterdensity(T)
@@ -352,7 +525,7 @@ def FluxGrav(lwc,
     # Ann. Geophys. 27, 3571–3576 (2009).
     # the original formula in Beswick 1991) employs the radius and this is
     # the diameter derived version
-    sedspeed = -g * midpoints**2 * (rho_water - rho_air) / 18 / muair
+    sedspeed = -g * midpoints2 * (rho_water - rho_air) / 18 / muair
 
     gravflux = lwc * sedspeed
 
@@ -362,112 +535,53 @@ def FluxGrav(lwc,
 
 def Gonser2011(bincounts=np.ones(30),
                returnnewsizes=True,
-               getbins=False):
+               getbins=False,
+               binaxis=None):
 
-    # directly from paper applied onto the 30 CDP bins
+    # directly from paper applied onto the 30 CDP bins, see REBIN_TABLE
     # take note that this will also mean, that the passed in bins to
     # all derived quantities like LWC/Conc need to be adjusted for
     # the proper calculations thereof
-    sca = {
-        2.66: [[0, 0.66]],
-        4.66: [[0, 0.34], [1, 1.0], [2, 0.66]],
-        7.41: [[2, 0.34], [3, 1.0], [4, 1], [5, 0.41]],
-        9.66: [[5, 0.59], [6, 1.0], [7, 0.66]],
-        11.36: [[7, 0.34], [8, 1.0], [9, 0.36]],
-        13.21: [[9, 0.64], [10, 1.0], [11, 0.21]],
-        15.26: [[11, 0.79], [12, 1.26 / 2]],
-        18.01: [[12, 0.74 / 2], [13, 1.0], [14, 0.01 / 2]],
-        19.96: [[14, 1.95 / 2]],
-        21.96: [[14, 0.04 / 2], [15, 1.96 / 2]],
-        23.61: [[15, 0.04 / 2], [16, 1.61 / 2]],
-        25.01: [[16, 0.39 / 2], [17, 1.01 / 2]],
-        26.51: [[17, 0.99 / 2], [18, 0.51 / 2]],
-        28.46: [[18, 1.49 / 2], [19, 0.46 / 2]],
-        30.51: [[19, 1.54 / 2], [20, 0.51 / 2]],
-        33.36: [[20, 1.49 / 2], [21, 1.36 / 2]],
-        35.26: [[21, 0.64 / 2], [22, 1.26 / 2]],
-        37.06: [[22, 0.74 / 2], [23, 1.06 / 2]],
-        39.01: [[23, 0.94 / 2], [24, 1.01 / 2]],
-        41.11: [[24, 0.99 / 2], [25, 1.11 / 2]],
-        43.76: [[25, 0.89 / 2], [26, 1.76 / 2]],
-        46.41: [[26, 0.24 / 2], [27, 1.0], [28, 0.41 / 2]],
-        50: [[28, 1.59 / 2], [29, 1.0]],
-    }
-
-
     if getbins:
-        return [2.0] + list(sca.keys())
-
-    binsizes = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16, 18, 20,
-                22, 24, 26, 28, 30, 32, 34, 36, 38, 40, 42, 44, 46, 48, 50]
+        return list(REBIN_BINSIZES)
 
-    if bincounts.shape[1] != 30:
-        bincounts = bincounts.copy().transpose()
+    # without binaxis a 2D array is turned to have the 30 bins last,
+    # otherwise the bins are taken along binaxis (also of N-D arrays)
+    if binaxis is None:
+        if bincounts.shape[1] != 30:
+            bincounts = bincounts.copy().transpose()
+        binaxis = -1
 
-
-    _ = [0] * len(binsizes)
-    output = np.zeros((bincounts.shape[0], len(sca.keys())))
-    for newbinno, newbinsize in enumerate(sca.keys()):
-        for scalepair in sca[newbinsize]:
-            output[:, newbinno] += bincounts[:, scalepair[0]] * scalepair[1]
+    # the table is applied as one (cached) 30 x 23 weight matrix
+    output = Rebin(bincounts, TableMatrix(REBIN_TABLE), binaxis=binaxis)
 
     if not returnnewsizes:
         return output
     newsizes = [2.00]
-    newsizes.extend(sorted(list(sca.keys())))
+    newsizes.extend(sorted(list(REBIN_TABLE.keys())))
     return output,  newsizes
 
 
-def Spiegel2012(bincounts,
-                returnnewsizes=True):
+def Spiegel2012(bincounts=None,
+                returnnewsizes=True,
+                getbins=False,
+                binaxis=None):
 
-    if bincounts.shape[1] != 30:
-        bincounts = bincounts.copy().transpose()
+    # without binaxis a 2D array is turned to have the 30 bins last,
+    # otherwise the bins are taken along binaxis (also of N-D arrays)
+    if binaxis is None:
+        if not getbins and bincounts.shape[1] != 30:
+            bincounts = bincounts.copy().transpose()
+        binaxis = -1
 
-    # directly from paper applied onto the 30 CDP bins
+    # directly from paper applied onto the 30 CDP bins, see REBIN_TABLE
     # take note that this will also mean, that the passed in bins to
     # all derived quantities like LWC/Conc need to be adjusted for
     # the proper calculations thereof
-    sca = {
-        2.66: [[0, 0.66]],
-        4.66: [[0, 0.34], [1, 1.0], [2, 0.66]],
-        7.41: [[2, 0.34], [3, 1.0], [4, 1], [5, 0.41]],
-        9.66: [[5, 0.59], [6, 1.0], [7, 0.66]],
-        11.36: [[7, 0.34], [8, 1.0], [9, 0.36]],
-        13.21: [[9, 0.64], [10, 1.0], [11, 0.21]],
-        15.26: [[11, 0.79], [12, 1.26 / 2]],
-        18.01: [[12, 0.74 / 2], [13, 1.0], [14, 0.01 / 2]],
-        19.96: [[14, 1.95 / 2]],
-        21.96: [[14, 0.04 / 2], [15, 1.96 / 2]],
-        23.61: [[15, 0.04 / 2], [16, 1.61 / 2]],
-        25.01: [[16, 0.39 / 2], [17, 1.01 / 2]],
-        26.51: [[17, 0.99 / 2], [18, 0.51 / 2]],
-        28.46: [[18, 1.49 / 2], [19, 0.46 / 2]],
-        30.51: [[19, 1.54 / 2], [20, 0.51 / 2]],
-        33.36: [[20, 1.49 / 2], [21, 1.36 / 2]],
-        35.26: [[21, 0.64 / 2], [22, 1.26 / 2]],
-        37.06: [[22, 0.74 / 2], [23, 1.06 / 2]],
-        39.01: [[23, 0.94 / 2], [24, 1.01 / 2]],
-        41.11: [[24, 0.99 / 2], [25, 1.11 / 2]],
-        43.76: [[25, 0.89 / 2], [26, 1.76 / 2]],
-        46.41: [[26, 0.24 / 2], [27, 1.0], [28, 0.41 / 2]],
-        50: [[28, 1.59 / 2], [29, 1.0]],
-    }
-
-
-    binsizes = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16, 18, 20,
-                22, 24, 26, 28, 30, 32, 34, 36, 38, 40, 42, 44, 46, 48, 50]
-    _ = [0] * len(binsizes)
-    output = np.zeros((bincounts.shape[0], len(sca.keys())))
-    for newbinno, newbinsize in enumerate(sca.keys()):
-        for scalepair in sca[newbinsize]:
-            output[:, newbinno] += bincounts[:, scalepair[0]] * scalepair[1]
-
-    return (output, [2.0] + list(sca.keys())) if returnnewsizes else output
-
-
-
-
-
+    if getbins:
+        return list(REBIN_BINSIZES)
 
+    # the table is applied as one (cached) 30 x 23 weight matrix
+    output = Rebin(bincounts, TableMatrix(REBIN_TABLE), binaxis=binaxis)
 
+    return (output, list(REBIN_BINSIZES)) if returnnewsizes else output
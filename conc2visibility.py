@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+from Mie import MIE_CACHEDIR, WATER_REFRACTIVEINDEX
+
+
+# follows the Koschmeider equation, 3.91/sigma_e
+def conc2visibility(conc,  # needs to be in # / cm^3 per bin
+                    binsizes=[2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 16,
+                              18, 20, 22, 24, 26, 28, 30, 32, 34, 36, 38, 40,
+                              42, 44, 46, 48, 50],
+                    wavelength=0.55,  # in micrometer
+                    refractiveindex=WATER_REFRACTIVEINDEX,
+                    cachedir=MIE_CACHEDIR,
+                    ):
+    import numpy as np
+    from BinGeometry import BinGeometry
+    from Mie import MieExtinctionTable
+    from Moments import WeightedSum
+    from Sparse import SparseBins, SparseApply
+    if isinstance(conc, SparseBins):
+        # only the records with counts are calculated, see Sparse
+        return SparseApply(conc2visibility, conc, fill=np.inf,
+                           binsizes=binsizes,
+                           wavelength=wavelength,
+                           refractiveindex=refractiveindex,
+                           cachedir=cachedir)
+
+    # binsizes can also be a BinGeometry or the name of a preset
+    geometry = BinGeometry(binsizes)
+
+    # the mie extinction efficiency per bin is only calculated once for
+    # each wavelength and binsizes and taken from disk afterwards
+    qext = MieExtinctionTable(geometry,
+                              wavelength=wavelength,
+                              refractiveindex=refractiveindex,
+                              cachedir=cachedir)
+
+    # extinction cross section per bin in um^2
+    crosssection = np.pi * geometry.r2 * qext
+
+    # extinction coefficient in 1 / km, as um^2 / cm^3 = 10**-3 / km
+    sigma_e = WeightedSum(conc, crosssection) * 10**-3
+
+    # visibility in km, no droplets means infinite visibility
+    with np.errstate(divide='ignore'):
+        visibility = 3.91 / sigma_e
+
+    return visibility
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+StreamAggregator gives the cdp_data_halfhour fields of a plain loop over
+the intervals, the same for any chunking of the records.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose, assert_array_equal
+
+from Aggregate import HALFHOUR, HALFHOUR_FIELDS, Aggregate
+from DecodeRaw import DecodeRaw
+from Simulator import SimulatedPackets
+
+
+@pytest.fixture(scope='module')
+def records():
+    # cdp_data table at 10 Hz with a gap, varying housekeeping and scan
+    # counters, ordered as the logger writes the fields
+    rng = np.random.default_rng(17)
+    nrecords = 20000
+    decoded = DecodeRaw(SimulatedPackets(nrecords, rng=rng))
+    tenths = np.arange(nrecords)
+    tenths[12000:] += 36000
+    # starts within an interval, some records are exactly on its end
+    tenths += 10 * (HALFHOUR * 500000 + 1234)
+
+    dtype = ([('SECONDS', '>u4'), ('NANOSECONDS', '>u4'), ('RECORD', '>u4')] +
+             [(name, '>f4') for name, values in decoded.items()
+              if values.dtype.kind == 'f'] +
+             [('DOF_Reject', '>u4'), ('ADC_Overflow', '>u4'),
+              ('cdp_data_bincount', '>u4', (30,)),
+              ('cdp_flushed_scans', '>u4'), ('cdp_skipped_scans', '>u4'),
+              ('cdp_wrong_scans', '>u4')])
+    data = np.zeros(nrecords, dtype=dtype)
+    data['SECONDS'] = tenths // 10
+    data['NANOSECONDS'] = (tenths % 10) * 10**8
+    data['RECORD'] = np.arange(nrecords)
+    for name in data.dtype.names[3:]:
+        if name == 'cdp_data_bincount':
+            data[name] = decoded[name]
+        elif data.dtype[name].kind == 'f':
+            data[name] = rng.normal(20, 5, nrecords)
+        else:
+            data[name] = rng.integers(0, 2**16, nrecords)
+    return data
+
+
+def _loop(data, interval):
+    # every interval on its own, labeled by its end
+    time = data['SECONDS'] + data['NANOSECONDS'] * 10**-9
+    labels = np.ceil(time / interval) * interval
+    expected = {name: [] for name, _, _ in HALFHOUR_FIELDS}
+    expected['time'], expected['nrecords'] = [], []
+    for label in np.unique(labels):
+        group = data[labels == label]
+        expected['time'].append(label)
+        expected['nrecords'].append(group.shape[0])
+        for name, field, how in HALFHOUR_FIELDS:
+            values = group[field]
+            if how == 'avg':
+                value = np.float32(values.astype(np.float64).mean())
+            elif how == 'tot':
+                value = values.sum(axis=0)
+            elif how == 'max':
+                value = values.max(axis=0)
+            else:
+                value = values.min(axis=0)
+            expected[name].append(value)
+    return {name: np.asarray(values) for name, values in expected.items()}
+
+
+@pytest.mark.parametrize('interval', [60, HALFHOUR])
+@pytest.mark.parametrize('chunksize', [None, 7, 999, 4096, 'random'])
+def test_halfhour_fields(records, interval, chunksize):
+    if chunksize is None:
+        chunks = records
+    elif chunksize == 'random':
+        # uneven chunks, single records included
+        rng = np.random.default_rng(interval)
+        splits = np.cumsum(rng.choice([1, 2, 50, 3000], 200))
+        chunks = np.split(records, splits[splits < records.shape[0]])
+    else:
+        chunks = [records[_:_ + chunksize]
+                  for _ in range(0, records.shape[0], chunksize)]
+    result = Aggregate(chunks, interval=interval)
+    expected = _loop(records, interval)
+
+    assert_array_equal(result['time'], expected['time'])
+    assert_array_equal(result['nrecords'], expected['nrecords'])
+    for name, _, how in HALFHOUR_FIELDS:
+        if how == 'avg':
+            assert result[name].dtype == np.float32
+            # the sums are only added up in another order
+            assert_allclose(result[name], expected[name], rtol=1e-6)
+        else:
+            assert_array_equal(result[name], expected[name])
+
+
+def test_volume(records):
+    # the sampled volume of an interval is the sum over its records
+    windspeed = np.linspace(1, 10, records.shape[0])
+    chunks = [records[_:_ + 999] for _ in range(0, records.shape[0], 999)]
+    parts = iter([windspeed[_:_ + 999]
+                  for _ in range(0, records.shape[0], 999)])
+    result = Aggregate(chunks, interval=60,
+                       windspeed=lambda chunk: next(parts))
+
+    time = records['SECONDS'] + records['NANOSECONDS'] * 10**-9
+    labels = np.ceil(time / 60) * 60
+    # m/s * mm^2 / Hz in cm^3
+    volume = windspeed * 100 * 0.298 / 100 / 10
+    expected = [volume[labels == _].sum() for _ in np.unique(labels)]
+    assert_allclose(result['volume'], expected, rtol=1e-12)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The kernels of Kernels give the same results as the numpy code, run as
+plain python (backend 'python') and compiled if numba is installed.
+
+@author: spirrobe -> github.com/spirrobe/
+"""
+
+import numpy as np
+import pytest
+from numpy.testing import assert_allclose, assert_array_equal
+
+import Kernels
+from BinGeometry import BinGeometry, CDP2_BINSIZES
+from DecodeRaw import DecodeRaw
+from DiameterQuantiles import DiameterQuantiles
+from Kernels import JitDecodeBins, JitQuantiles, JitRebin
+from Rebin import OverlapMatrix, Rebin, TableMatrix
+from Simulator import EncodePackets, LognormalBins
+
+BACKENDS = ['python'] + ([] if Kernels.numba is None else ['numba'])
+
+
+@pytest.fixture
+def bincounts():
+    # lognormal fog bins with empty records, nan and negative values
+    rng = np.random.default_rng(23)
+    bins = LognormalBins(2000, rng=rng).astype(np.float64)
+    bins[::7] = 0
+    bins[3, 4] = np.nan
+    bins[5, :] = -1
+    return bins
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('weights', ['lwc', 'volume', 'number'])
+def test_quantiles(bincounts, backend, weights):
+    geometry = BinGeometry(CDP2_BINSIZES)
+    quantiles = [0, 0.1, 0.5, 0.9, 1]
+    factor = geometry.dropvolume if weights == 'volume' else None
+    expected = DiameterQuantiles(bincounts, quantiles, weights=weights,
+                                 backend='numpy')
+    result = JitQuantiles(bincounts, quantiles, geometry, factor,
+                          backend=backend)
+    assert_allclose(result, expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('matrix', ['table', 'overlap'])
+def test_rebin(bincounts, backend, matrix):
+    matrix = TableMatrix() if matrix == 'table' else OverlapMatrix()
+    expected = Rebin(bincounts, matrix, backend='numpy')
+    result = JitRebin(bincounts, matrix, backend=backend)
+    assert_allclose(result, expected, rtol=1e-12, equal_nan=True)
+    assert_array_equal(np.isnan(result), np.isnan(expected))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_decodebins(backend):
+    rng = np.random.default_rng(23)
+    counts = LognormalBins(500, rng=rng)
+    # counts above 16 bit to check the high word
+    counts[::11, 5] = rng.integers(2**16, 2**32, counts[::11].shape[0])
+    packets = EncodePackets(counts, broken=0.1, rng=rng)
+    expected = DecodeRaw(packets, backend='numpy')
+    bins, chksum = JitDecodeBins(packets, backend=backend)
+    assert_allclose(bins, expected['cdp_data_bincount'], rtol=0)
+    assert_allclose(chksum, expected['cdp_data_calc_chksum'], rtol=0)
+    assert bins.dtype == expected['cdp_data_bincount'].dtype
+
+
+@pytest.mark.skipif(Kernels.numba is None, reason='numba is not installed')
+def test_backends(bincounts):
+    # the same through the functions themselves
+    assert_allclose(DiameterQuantiles(bincounts, 0.5, backend='numba'),
+                    DiameterQuantiles(bincounts, 0.5, backend='numpy'),
+                    rtol=1e-12)
+    assert_allclose(Rebin(bincounts, backend='numba'),
+                    Rebin(bincounts, backend='numpy'),
+                    rtol=1e-12, equal_nan=True)
+
+
+def test_fallback():
+    # auto falls back to numpy without numba, numba then raises
+    if Kernels.numba is None:
+        assert Kernels.Backend('auto') == 'numpy'
+        with pytest.raises(ImportError):
+            Kernels.Backend('numba')
+    else:
+        assert Kernels.Backend('auto') == 'numba'
+    with pytest.raises(ValueError):
+        Kernels.Backend('fortran')